@@ -82,6 +82,9 @@ class Backtest(object):
             else:
                 break
 
+            # Collect any fills reported by the brokerage
+            self.execution_handler.process_replies()
+
             # Handle the events
             while True:
                 try:
@@ -106,6 +109,10 @@ class Backtest(object):
                             self.fills += 1
                             self.portfolio.update_fill(event)
 
+            # Send any orders held back by the execution handler,
+            # e.g. for batching or rate limiting
+            self.execution_handler.flush_orders()
+
             time.sleep(self.heartbeat)
 
     def _output_performance(self):
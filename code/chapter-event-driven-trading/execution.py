@@ -36,6 +36,31 @@ class ExecutionHandler(object):
         """
         raise NotImplementedError("Should implement execute_order()")
 
+    def process_replies(self):
+        """
+        Applies any replies received from the brokerage since the
+        last call, placing the resulting Fill events onto the
+        Events queue. It is called once per heartbeat from the
+        trading loop, so that live handlers never have to mutate
+        shared state from their connection's thread.
+
+        Simulated handlers fill orders synchronously, so
+        by default there is nothing to do.
+        """
+        pass
+
+    def flush_orders(self):
+        """
+        Sends any orders held back since the last call. It is
+        called once per heartbeat, after the events generated by
+        the latest bar have been handled, so that handlers may
+        batch the orders of a bar before placing them.
+
+        By default orders are placed as they arrive, so
+        there is nothing to do.
+        """
+        pass
+
 
 class SimulatedExecutionHandler(ExecutionHandler):
     """
@@ -1,8 +1,12 @@
 # ib_execution.py
 
+from collections import deque
 from datetime import datetime as dt
+import logging
 import time
 
+import numpy as np
+
 from ib.ext.Contract import Contract
 from ib.ext.Order import Order
 from ib.opt import ibConnection, message
@@ -11,6 +15,16 @@ from event import FillEvent, OrderEvent
 from execution import ExecutionHandler
 
 
+# The TWS error codes which mean an order was rejected or will not
+# be worked. Every other code carrying an order ID, such as 399 or
+# the 21xx informational messages, is only a warning about it.
+REJECTION_CODES = frozenset([103, 110, 200, 201, 202, 203])
+
+# Server messages are logged rather than printed, as the handlers
+# run on the connection's thread, where every reply is latency
+logger = logging.getLogger(__name__)
+
+
 class IBExecutionHandler(ExecutionHandler):
     """
     Handles order execution via the Interactive Brokers
@@ -19,41 +33,110 @@ class IBExecutionHandler(ExecutionHandler):
     """
 
     def __init__(
-        self, events, order_routing="SMART", currency="USD"
+        self, events, order_routing="SMART", currency="USD",
+        tws_conn=None
     ):
         """
         Initialises the IBExecutionHandler instance.
 
         Parameters:
         events - The Queue of Event objects.
+        order_routing - The exchange to route orders to.
+        currency - The currency of the contracts.
+        tws_conn - An optional connection to use in place of a new
+            TWS connection, e.g. a SimulatedTWSConnection.
         """
         self.events = events
         self.order_routing = order_routing
         self.currency = currency
+
+        # The order-state table, indexed by order ID. It is only
+        # ever read or written on the trading thread.
         self.fill_dict = {}
 
-        self.tws_conn = self.create_tws_connection()
+        # Server replies handed from the connection's thread to
+        # the trading thread. There is a single producer and a
+        # single consumer, and deque.append/popleft are atomic,
+        # so no lock is needed on either side.
+        self.replies = deque()
+
+        # Orders awaiting submission to TWS, as
+        # (order ID, contract, order) tuples
+        self.order_queue = deque()
+
+        # Our own overhead from receiving an OrderEvent to
+        # handing it to the connection, and the round trip
+        # from submission to the first TWS acknowledgement
+        self.submit_latencies = []
+        self.ack_latencies = []
+
+        if tws_conn is None:
+            self.tws_conn = self.create_tws_connection()
+        else:
+            self.tws_conn = tws_conn
+            self.tws_conn.connect()
         self.order_id = self.create_initial_order_id()
         self.register_handlers()
 
     def _error_handler(self, msg):
         """Handles the capturing of error messages"""
-        # Currently no error handling.
-        print("Server Error: %s" % msg)
+        # Hand order rejections over to the trading thread, leaving
+        # warnings out of the order state and acknowledgement times
+        order_id = getattr(msg, "id", None)
+        if order_id is not None and order_id >= 0 and \
+                getattr(msg, "errorCode", None) in REJECTION_CODES:
+            self.replies.append(
+                ("error", order_id, msg.errorCode, 0, 0.0, time.perf_counter())
+            )
+            logger.warning("Server Error: %s", msg)
+        else:
+            logger.debug("Server Error: %s", msg)
 
     def _reply_handler(self, msg):
-        """Handles of server replies"""
-        # Handle open order orderId processing
-        if msg.typeName == "openOrder" and \
-            msg.orderId == self.order_id and \
-            not self.fill_dict.has_key(msg.orderId):
-            self.create_fill_dict_entry(msg)
-        # Handle Fills
-        if msg.typeName == "orderStatus" and \
-            msg.status == "Filled" and \
-            self.fill_dict[msg.orderId]["filled"] == False:
-            self.create_fill(msg)
-        print("Server Response: %s, %s\n" % (msg.typeName, msg))
+        """
+        Handles of server replies. This runs on the connection's
+        thread, so it only copies the fields of interest onto the
+        replies queue, leaving all state changes to the trading
+        thread in process_replies.
+        """
+        if msg.typeName == "openOrder":
+            self.replies.append(
+                ("openOrder", msg.orderId, None, 0, 0.0, time.perf_counter())
+            )
+        elif msg.typeName == "orderStatus":
+            self.replies.append((
+                "orderStatus", msg.orderId, msg.status, msg.filled,
+                msg.avgFillPrice, time.perf_counter()
+            ))
+        logger.debug("Server Response: %s, %s", msg.typeName, msg)
+
+    def process_replies(self):
+        """
+        Applies the server replies received since the last call,
+        in the order they arrived, to the order-state table. Each
+        increase in an order's filled quantity produces a FillEvent
+        for the newly filled shares, so partial fills are passed
+        on as they happen.
+
+        Must be called from the trading thread.
+        """
+        while self.replies:
+            type_name, order_id, status, filled, avg_price, recv_time = \
+                self.replies.popleft()
+            fd = self.fill_dict.get(order_id)
+            if fd is None:
+                # Not an order placed by this session
+                continue
+
+            if fd["ack_time"] is None:
+                self.record_ack(fd, recv_time)
+
+            if type_name == "error":
+                fd["status"] = "Rejected"
+            elif type_name == "orderStatus":
+                fd["status"] = status
+                if filled > fd["filled_qty"]:
+                    self.create_fill(order_id, filled, avg_price)
 
     def create_tws_connection(self):
         """
@@ -118,54 +201,102 @@ class IBExecutionHandler(ExecutionHandler):
         order.m_action = action
         return order
 
-    def create_fill_dict_entry(self, msg):
+    def create_fill_dict_entry(self, order_id, symbol, direction, quantity):
         """
         Creates an entry in the Fill Dictionary that lists
         orderIds and provides security information. This is
         needed for the event-driven behaviour of the IB
         server message behaviour.
+
+        The entry is made when the order is submitted, rather
+        than on receipt of the openOrder message, so that every
+        reply can be matched to its order by ID alone.
         """
-        self.fill_dict[msg.orderId] = {
-            "symbol": msg.contract.m_symbol,
-            "exchange": msg.contract.m_exchange,
-            "direction": msg.order.m_action,
-            "filled": False
+        self.fill_dict[order_id] = {
+            "symbol": symbol,
+            "exchange": self.order_routing,
+            "direction": direction,
+            "quantity": quantity,
+            "status": "PendingSubmit",
+            "filled_qty": 0,
+            "avg_price": 0.0,
+            "submit_time": None,
+            "ack_time": None
         }
 
-    def create_fill(self, msg):
+    def record_ack(self, fd, recv_time):
+        """
+        Records the time at which TWS first acknowledged an
+        order, either via openOrder or orderStatus.
+
+        Parameters:
+        fd - The order's entry in the fill dictionary.
+        recv_time - When the connection thread received the reply.
+        """
+        fd["ack_time"] = recv_time
+        if fd["submit_time"] is not None:
+            self.ack_latencies.append(recv_time - fd["submit_time"])
+
+    def create_fill(self, order_id, filled, avg_price):
         """
         Handles the creation of the FillEvent that will be
         placed onto the events queue subsequent to an order
-        being filled.
+        being (partially) filled.
+
+        IB reports the cumulative filled quantity and average
+        price, so the fill is for the shares filled since the
+        last update, at the price implied by the change in the
+        average.
+
+        Parameters:
+        order_id - The ID of the filled order.
+        filled - The cumulative quantity filled.
+        avg_price - The average price of the cumulative quantity.
         """
-        fd = self.fill_dict[msg.orderId]
+        fd = self.fill_dict[order_id]
 
         # Prepare the fill data
-        symbol = fd["symbol"]
-        exchange = fd["exchange"]
-        filled = msg.filled
-        direction = fd["direction"]
-        fill_cost = msg.avgFillPrice
+        quantity = filled - fd["filled_qty"]
+        fill_cost = (
+            avg_price * filled - fd["avg_price"] * fd["filled_qty"]
+        ) / quantity
 
         # Create a fill event object
         fill = FillEvent(
-            dt.utcnow(), symbol,
-            exchange, filled, direction, fill_cost
+            dt.utcnow(), fd["symbol"],
+            fd["exchange"], quantity, fd["direction"], fill_cost
         )
 
-        # Make sure that multiple messages don't create
-        # additional fills.
-        self.fill_dict[msg.orderId]["filled"] = True
+        # Make sure that repeated status messages don't
+        # create additional fills.
+        fd["filled_qty"] = filled
+        fd["avg_price"] = avg_price
 
         # Place the fill event onto the event queue
-        self.events.put(fill_event)
+        self.events.put(fill)
+
+    def send_orders(self):
+        """
+        Submits every queued order to TWS. placeOrder only writes
+        the request to the socket, so this returns immediately;
+        the acknowledgements and fills arrive asynchronously via
+        the registered reply handler.
+        """
+        while self.order_queue:
+            order_id, ib_contract, ib_order = self.order_queue.popleft()
+            fd = self.fill_dict[order_id]
+            fd["submit_time"] = time.perf_counter()
+            fd["status"] = "Submitted"
+            self.tws_conn.placeOrder(order_id, ib_contract, ib_order)
 
     def execute_order(self, event):
         """
-        Creates the necessary InteractiveBrokers order object
-        and submits it to IB via their API.
+        Creates the necessary InteractiveBrokers order object,
+        queues it against a new order ID and submits it to IB
+        via their API, without waiting for a response.
 
-        The results are then queried in order to generate a
+        The order is tracked by its ID in the fill dictionary,
+        so that the later server replies generate the
         corresponding Fill object, which is placed back on
         the event queue.
 
@@ -173,6 +304,8 @@ class IBExecutionHandler(ExecutionHandler):
         event - Contains an Event object with order information.
         """
         if event.type == 'ORDER':
+            start = time.perf_counter()
+
             # Prepare the parameters for the asset order
             asset = event.symbol
             asset_type = "STK"
@@ -193,14 +326,35 @@ class IBExecutionHandler(ExecutionHandler):
                 order_type, quantity, direction
             )
 
-            # Use the connection to the send the order to IB
-            self.tws_conn.placeOrder(
-                self.order_id, ib_contract, ib_order
+            # Track the order by its ID and queue it for submission
+            self.create_fill_dict_entry(
+                self.order_id, asset, direction, quantity
             )
-
-            # NOTE: This following line is crucial.
-            # It ensures the order goes through!
-            time.sleep(1)
+            self.order_queue.append((self.order_id, ib_contract, ib_order))
 
             # Increment the order ID for this session
             self.order_id += 1
+
+            # Use the connection to send the queued orders to IB
+            self.send_orders()
+            self.submit_latencies.append(time.perf_counter() - start)
+
+    def latency_stats(self):
+        """
+        Returns the mean, median and 99th percentile, in
+        microseconds, of our own order submission overhead
+        and of the submit-to-acknowledgement round trip.
+        """
+        stats = {}
+        for name, lat in (
+            ("submit", self.submit_latencies), ("ack", self.ack_latencies)
+        ):
+            lat = np.asarray(lat) * 1e6
+            if lat.size > 0:
+                stats[name] = {
+                    "count": lat.size,
+                    "mean_us": lat.mean(),
+                    "median_us": np.median(lat),
+                    "p99_us": np.percentile(lat, 99),
+                }
+        return stats
@@ -0,0 +1,197 @@
+# order_throttle.py
+
+from collections import deque
+import itertools
+import time
+
+from event import OrderEvent
+from execution import ExecutionHandler
+
+
+class TokenBucket(object):
+    """
+    A token bucket rate limiter. Tokens accrue continuously at
+    the given rate up to the capacity, and each message sent
+    consumes one, so that bursts of up to capacity messages are
+    allowed while the long-run rate never exceeds the limit.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        """
+        Initialises the bucket full.
+
+        Parameters:
+        rate - The number of tokens added per second.
+        capacity - The maximum number of tokens (defaults to rate).
+        clock - A function returning the current time in seconds.
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.last_time = self.clock()
+
+    def _refill(self):
+        """
+        Adds the tokens accrued since the last refill.
+        """
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.last_time) * self.rate
+        )
+        self.last_time = now
+
+    def consume(self, n=1):
+        """
+        Takes n tokens if they are available, returning
+        True if so and False otherwise.
+        """
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+
+class ThrottledExecutionHandler(ExecutionHandler):
+    """
+    Sits between the Portfolio and a live ExecutionHandler, such
+    as the IBExecutionHandler, to keep the order message rate under
+    the brokerage's limit. IB disconnects clients that exceed about
+    50 messages per second, which a burst of orders from a
+    multi-symbol strategy can easily do.
+
+    Orders are held until the end of each heartbeat, when market
+    orders for the same symbol are merged into a single net order
+    (dropping any that cancel out). Orders that reduce an existing
+    position are then sent before those that open or add to one, for
+    as long as the token bucket allows. Anything left over stays
+    queued, and is merged with any later orders for its symbol
+    before the next attempt to send.
+
+    To use it in place of the wrapped handler, pass a factory as
+    the Backtest execution handler, e.g.:
+
+    lambda events: ThrottledExecutionHandler(IBExecutionHandler(events))
+
+    Positions are tracked from the fills recorded in the wrapped
+    handler's fill dictionary, so it must number and track its
+    orders as the IBExecutionHandler does.
+    """
+
+    def __init__(self, execution_handler, max_msg_rate=45.0, burst=None):
+        """
+        Initialises the throttle around an execution handler.
+
+        Parameters:
+        execution_handler - The handler that places the orders.
+        max_msg_rate - The maximum number of orders per second.
+        burst - The maximum number of orders sent at once
+            (defaults to max_msg_rate).
+        """
+        self.execution_handler = execution_handler
+        self.bucket = TokenBucket(max_msg_rate, burst)
+
+        # Net signed market order quantity awaiting submission per
+        # symbol, along with the sequence number of its first order
+        self.pending_mkt = {}
+        # Other order types can't be merged, so are kept in order
+        self.pending_other = deque()
+        self._seq = itertools.count()
+
+        # The net position filled so far, used to tell exits
+        # from entries, and the filled quantity already counted
+        # towards it of each order still working
+        self.positions = {}
+        self.working = {}
+
+        self.orders_received = 0
+        self.orders_sent = 0
+
+    def execute_order(self, event):
+        """
+        Holds an Order event until the orders are next flushed.
+
+        Parameters:
+        event - Contains an Event object with order information.
+        """
+        if event.type == 'ORDER':
+            self.orders_received += 1
+            if event.order_type == 'MKT':
+                sign = 1 if event.direction == 'BUY' else -1
+                seq, qty = self.pending_mkt.get(
+                    event.symbol, (next(self._seq), 0)
+                )
+                self.pending_mkt[event.symbol] = (
+                    seq, qty + sign * event.quantity
+                )
+            else:
+                self.pending_other.append((next(self._seq), event))
+
+    def _is_exit(self, symbol, signed_qty):
+        """
+        Whether an order reduces the current position in a symbol.
+        """
+        position = self.positions.get(symbol, 0)
+        return position != 0 and (position > 0) != (signed_qty > 0)
+
+    def flush_orders(self):
+        """
+        Merges the held orders and sends as many as the rate
+        limit allows, exits first and then in arrival order.
+        """
+        # Drop any market orders that netted out to nothing
+        for symbol in [s for s, (_, q) in self.pending_mkt.items() if q == 0]:
+            del self.pending_mkt[symbol]
+
+        queued = []
+        for symbol, (seq, qty) in self.pending_mkt.items():
+            queued.append((not self._is_exit(symbol, qty), seq, symbol, None))
+        for seq, event in self.pending_other:
+            qty = event.quantity if event.direction == 'BUY' else -event.quantity
+            queued.append(
+                (not self._is_exit(event.symbol, qty), seq, event.symbol, event)
+            )
+        queued.sort(key=lambda q: (q[0], q[1]))
+
+        sent = set()
+        for is_entry, seq, symbol, event in queued:
+            if not self.bucket.consume():
+                break
+            if event is None:
+                seq, qty = self.pending_mkt.pop(symbol)
+                event = OrderEvent(
+                    symbol, 'MKT', abs(qty), 'BUY' if qty > 0 else 'SELL'
+                )
+            else:
+                sent.add(seq)
+            order_id = self.execution_handler.order_id
+            self.execution_handler.execute_order(event)
+            self.working[order_id] = 0
+            self.orders_sent += 1
+
+        if sent:
+            self.pending_other = deque(
+                (seq, event) for seq, event in self.pending_other
+                if seq not in sent
+            )
+
+    def process_replies(self):
+        """
+        Passes through to the wrapped handler, then adds any
+        newly filled quantities to the positions. Orders are
+        no longer tracked once fully filled, rejected or cancelled.
+        """
+        self.execution_handler.process_replies()
+        fill_dict = self.execution_handler.fill_dict
+        for order_id, counted in list(self.working.items()):
+            fd = fill_dict[order_id]
+            filled = fd["filled_qty"]
+            if filled > counted:
+                sign = 1 if fd["direction"] == 'BUY' else -1
+                self.positions[fd["symbol"]] = \
+                    self.positions.get(fd["symbol"], 0) + sign * (filled - counted)
+                self.working[order_id] = filled
+            if filled >= fd["quantity"] or \
+                    fd["status"] in ("Rejected", "Cancelled", "ApiCancelled", "Inactive"):
+                del self.working[order_id]
@@ -0,0 +1,308 @@
+# tws_sim.py
+
+import heapq
+import itertools
+import queue
+import random
+import threading
+import time
+
+from event import OrderEvent
+
+
+class SimulatedMessage(object):
+    """
+    A stand-in for the IbPy message objects passed to the
+    registered handlers. The message fields are set as
+    attributes, alongside the message typeName.
+    """
+
+    def __init__(self, typeName, **fields):
+        self.typeName = typeName
+        for key, value in fields.items():
+            setattr(self, key, value)
+        self._fields = fields
+
+    def __str__(self):
+        return "<%s %s>" % (
+            self.typeName,
+            ", ".join("%s=%s" % kv for kv in self._fields.items())
+        )
+
+
+class SimulatedOrderState(object):
+    """
+    A stand-in for the IbPy OrderState attached to openOrder.
+    """
+
+    def __init__(self, status):
+        self.m_status = status
+
+
+class SimulatedTWSConnection(object):
+    """
+    A local stand-in for the IbPy ibConnection, simulating the
+    Trader Workstation (TWS) end of the order flow so that the
+    IBExecutionHandler can be tested and benchmarked without a
+    live TWS or network access.
+
+    Each order passed to placeOrder is acknowledged with openOrder
+    and orderStatus('Submitted') messages after a configurable
+    latency. It is then either rejected, with an error message and
+    orderStatus('Cancelled'), or filled in one or more partial fills
+    ending with orderStatus('Filled'). As with IbPy, messages are
+    dispatched to the registered handlers on the connection's own
+    thread, not the caller's.
+    """
+
+    def __init__(
+        self, ack_latency=0.001, fill_latency=0.005, partial_fills=1,
+        reject_rate=0.0, fill_price=100.0, seed=None
+    ):
+        """
+        Initialises the simulated connection.
+
+        Parameters:
+        ack_latency - Seconds from placeOrder to the acknowledgement.
+        fill_latency - Seconds between the acknowledgement and each
+            (partial) fill.
+        partial_fills - The number of fills each order is split into.
+        reject_rate - The probability that an order is rejected.
+        fill_price - The fill price, or a callable taking the symbol
+            and returning the fill price.
+        seed - The random seed for rejections.
+        """
+        self.ack_latency = ack_latency
+        self.fill_latency = fill_latency
+        self.partial_fills = partial_fills
+        self.reject_rate = reject_rate
+        self.fill_price = fill_price
+        self.random = random.Random(seed)
+
+        self.handlers = []
+        self.connected = False
+
+        # Messages due to be dispatched, as (due time, seq, msg)
+        self._schedule = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def connect(self):
+        """
+        Starts the thread that dispatches messages to the handlers.
+        """
+        self.connected = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return True
+
+    def disconnect(self):
+        """
+        Stops the dispatch thread once it is idle.
+        """
+        with self._cond:
+            self.connected = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        return True
+
+    def isConnected(self):
+        return self.connected
+
+    def register(self, listener, *types):
+        """
+        Registers a handler for the given message type names.
+        """
+        names = set(t.lower() for t in types)
+        self.handlers.append((listener, names))
+
+    def registerAll(self, listener):
+        """
+        Registers a handler for every message type.
+        """
+        self.handlers.append((listener, None))
+
+    def placeOrder(self, order_id, contract, order):
+        """
+        Accepts an order and schedules its acknowledgement and
+        fill (or rejection) messages. Returns immediately.
+        """
+        now = time.perf_counter()
+        quantity = order.m_totalQuantity
+        ack_time = now + self.ack_latency
+        msgs = [
+            (ack_time, SimulatedMessage(
+                "openOrder", orderId=order_id, contract=contract,
+                order=order, orderState=SimulatedOrderState("Submitted")
+            )),
+            (ack_time, self._order_status(order_id, "Submitted", 0, quantity, 0.0)),
+        ]
+
+        if self.random.random() < self.reject_rate:
+            msgs.append((ack_time, SimulatedMessage(
+                "error", id=order_id, errorCode=201,
+                errorMsg="Order rejected - reason: simulated rejection"
+            )))
+            msgs.append((ack_time, self._order_status(
+                order_id, "Cancelled", 0, quantity, 0.0
+            )))
+        else:
+            price = self.fill_price
+            if callable(price):
+                price = price(contract.m_symbol)
+            # Split the quantity into the partial fills, with
+            # any remainder going to the final fill
+            n_fills = max(1, min(self.partial_fills, quantity))
+            slice_qty = quantity // n_fills
+            filled = 0
+            for i in range(n_fills):
+                filled = quantity if i == n_fills - 1 else filled + slice_qty
+                status = "Filled" if filled == quantity else "Submitted"
+                msgs.append((
+                    ack_time + (i + 1) * self.fill_latency,
+                    self._order_status(
+                        order_id, status, filled, quantity - filled, price
+                    )
+                ))
+
+        with self._cond:
+            for due, msg in msgs:
+                heapq.heappush(self._schedule, (due, next(self._seq), msg))
+            self._cond.notify()
+
+    def _order_status(self, order_id, status, filled, remaining, price):
+        """
+        Creates an orderStatus message.
+        """
+        return SimulatedMessage(
+            "orderStatus", orderId=order_id, status=status, filled=filled,
+            remaining=remaining, avgFillPrice=price, permId=order_id,
+            parentId=0, lastFillPrice=price, clientId=0, whyHeld=None
+        )
+
+    def _dispatch(self, msg):
+        """
+        Passes a message to every handler registered for its type.
+        """
+        name = msg.typeName.lower()
+        for listener, names in self.handlers:
+            if names is None or name in names:
+                try:
+                    listener(msg)
+                except Exception as e:
+                    # As with IbPy, a failing handler must not
+                    # stop the dispatch of further messages
+                    print("Handler error for %s: %r" % (msg, e))
+
+    def _run(self):
+        """
+        Dispatches each scheduled message once it is due.
+        """
+        while True:
+            with self._cond:
+                while True:
+                    if self._schedule:
+                        wait = self._schedule[0][0] - time.perf_counter()
+                        if wait <= 0:
+                            msg = heapq.heappop(self._schedule)[2]
+                            break
+                        self._cond.wait(wait)
+                    elif not self.connected:
+                        return
+                    else:
+                        self._cond.wait()
+            self._dispatch(msg)
+
+
+def benchmark_execution(
+    n_orders=10000, symbols=("AAPL", "MSFT"), timeout=60.0, **sim_kwargs
+):
+    """
+    Benchmarks the live IBExecutionHandler path against a
+    SimulatedTWSConnection. The orders are submitted as fast as
+    possible while the calling thread plays the part of the trading
+    loop, draining the broker replies and the resulting fills, until
+    every order has been filled or rejected.
+
+    The fills are then checked to ensure that each filled order was
+    filled exactly once in total, and that no partial fills were
+    lost or duplicated under load.
+
+    Parameters:
+    n_orders - The number of orders to submit.
+    symbols - The symbols to alternate the orders between.
+    timeout - Seconds to wait for the orders to complete.
+    sim_kwargs - Passed to the SimulatedTWSConnection.
+    """
+    from ib_execution import IBExecutionHandler
+
+    events = queue.Queue()
+    conn = SimulatedTWSConnection(**sim_kwargs)
+    handler = IBExecutionHandler(events, tws_conn=conn)
+    done = ("Filled", "Cancelled", "Rejected")
+
+    filled = {}
+    n_fills = 0
+
+    def drain():
+        handler.process_replies()
+        count = 0
+        while True:
+            try:
+                fill = events.get(False)
+            except queue.Empty:
+                return count
+            filled[fill.symbol] = filled.get(fill.symbol, 0) + fill.quantity
+            count += 1
+
+    start = time.perf_counter()
+    for i in range(n_orders):
+        direction = 'BUY' if i % 2 == 0 else 'SELL'
+        handler.execute_order(
+            OrderEvent(symbols[i % len(symbols)], 'MKT', 100, direction)
+        )
+        n_fills += drain()
+    submit_time = time.perf_counter() - start
+
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        n_fills += drain()
+        if all(fd["status"] in done for fd in handler.fill_dict.values()):
+            break
+        time.sleep(0.001)
+    total_time = time.perf_counter() - start
+    conn.disconnect()
+    n_fills += drain()
+
+    expected = {}
+    for fd in handler.fill_dict.values():
+        if fd["status"] == "Filled":
+            expected[fd["symbol"]] = expected.get(fd["symbol"], 0) + fd["quantity"]
+
+    return {
+        "orders": n_orders,
+        "submit_orders_per_sec": n_orders / submit_time,
+        "filled_orders": sum(
+            fd["status"] == "Filled" for fd in handler.fill_dict.values()
+        ),
+        "rejected_orders": sum(
+            fd["status"] in ("Cancelled", "Rejected")
+            for fd in handler.fill_dict.values()
+        ),
+        "fills": n_fills,
+        "fills_per_sec": n_fills / total_time,
+        "fills_consistent": filled == expected,
+        "total_time": total_time,
+        "latency": handler.latency_stats(),
+    }
+
+
+if __name__ == "__main__":
+    import pprint
+
+    pprint.pprint(benchmark_execution(
+        n_orders=10000, ack_latency=0.0005, fill_latency=0.001,
+        partial_fills=2, reject_rate=0.01, seed=42
+    ))
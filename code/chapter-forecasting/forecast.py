@@ -12,9 +12,10 @@ from sklearn.discriminant_analysis import (
     LinearDiscriminantAnalysis as LDA, 
     QuadraticDiscriminantAnalysis as QDA
 )
-from sklearn.metrics import confusion_matrix
 from sklearn.svm import LinearSVC, SVC
 
+from model_evaluation import evaluate_models
+
 
 def create_dataframe(spy):
     """
@@ -204,14 +205,11 @@ if __name__ == "__main__":
             random_state=None, verbose=0)
         )
     ]
-    # Iterate through the models
-    for m in models:
-        # Train each of the models on the training set
-        m[1].fit(X_train, y_train)
-
-        # Make an array of predictions on the test set
-        pred = m[1].predict(X_test)
-
-        # Output the hit-rate and the confusion matrix for each model
-        print('%s:\n%0.3f' % (m[0], m[1].score(X_test, y_test)))
-        print('%s\n' % confusion_matrix(pred, y_test))
+    # Train and test all of the models concurrently
+    results = evaluate_models(models, X_train, y_train, X_test, y_test)
+
+    # Output the hit-rate and the confusion matrix for each model
+    for name, res in results.iterrows():
+        print('%s:\n%0.3f' % (name, res['hit_rate']))
+        print('%s\n' % res['confusion_matrix'])
+    print(results[['hit_rate', 'fit_time', 'predict_time']])
@@ -0,0 +1,293 @@
+# out_of_core.py
+
+from datetime import datetime as dt
+import json
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import confusion_matrix
+
+
+def feature_columns(lags=5):
+    """
+    The column layout of a lagged feature matrix.
+
+    Parameters
+    ----------
+    lags : `int`
+        default = 5. The number of lags.
+
+    Returns
+    -------
+    columns : `list`
+        The timestamp (seconds since the epoch), the lagged returns,
+        today's return and the direction.
+    """
+    return ["Timestamp"] + [f"Lag{i+1}" for i in range(lags)] + [
+        "Today", "Direction"
+    ]
+
+
+def _lagged_rows(timestamps, prices, carry, lags):
+    """
+    Computes the lagged percentage return rows for a chunk of
+    prices, continuing from the prices carried over from the
+    previous chunk of the same series.
+
+    Parameters
+    ----------
+    timestamps : `np.ndarray`
+        The timestamps of the chunk, in seconds since the epoch.
+    prices : `np.ndarray`
+        The adjusted close prices of the chunk.
+    carry : `np.ndarray`
+        The last lags+1 prices of the previous chunk (may be empty).
+    lags : `int`
+        The number of lags.
+
+    Returns
+    -------
+    rows : `np.ndarray`
+        The feature rows for the chunk.
+    carry : `np.ndarray`
+        The prices to carry over to the next chunk.
+    """
+    full = np.concatenate([carry, prices])
+    rets = (full[1:] / full[:-1] - 1.0) * 100.0
+    n_rows = len(rets) - lags
+    if n_rows <= 0:
+        return np.empty((0, lags + 3)), full[-(lags + 1):]
+
+    # Each window holds [r(t-lags), ..., r(t-1), r(t)]
+    windows = np.lib.stride_tricks.sliding_window_view(rets, lags + 1)
+    today = windows[:, -1].copy()
+    # As with create_returns_df, replace near-zero returns with a
+    # small number to stop issues with the QDA model
+    today[np.abs(today) < 0.0001] = 0.0001
+
+    rows = np.empty((n_rows, lags + 3))
+    rows[:, 0] = timestamps[-n_rows:]
+    rows[:, 1:lags + 1] = windows[:, -2::-1]
+    rows[:, lags + 1] = today
+    rows[:, lags + 2] = np.sign(today)
+    return rows, full[-(lags + 1):]
+
+
+def write_feature_memmap(
+    csv_files, path, lags=5, chunksize=100000,
+    date_col="Date", price_col="Adj Close"
+):
+    """
+    Builds the lagged returns feature matrix for one or more price
+    CSV files and writes it to a flat binary file that can be memory
+    mapped, reading each CSV in chunks. Unlike create_lagged_df, the
+    full history is never held in memory as a DataFrame.
+
+    Parameters
+    ----------
+    csv_files : `list`
+        The CSV files to process, e.g. one per symbol. Each series
+        is lagged independently.
+    path : `str`
+        The output file. A JSON description of its layout is
+        written alongside it, to path + '.json'.
+    lags : `int`
+        default = 5. The number of lags to create.
+    chunksize : `int`
+        default = 100000. The number of CSV rows read at a time.
+    date_col : `str`
+        default = 'Date'. The timestamp column of the CSV files.
+    price_col : `str`
+        default = 'Adj Close'. The price column of the CSV files.
+
+    Returns
+    -------
+    features : `np.memmap`
+        A read-only memory map of the written feature matrix.
+    """
+    n_rows = 0
+    with open(path, "wb") as f:
+        for csv_file in csv_files:
+            carry = np.empty(0)
+            for chunk in pd.read_csv(
+                csv_file, usecols=[date_col, price_col], chunksize=chunksize
+            ):
+                timestamps = pd.to_datetime(chunk[date_col]).values.astype(
+                    "datetime64[s]"
+                ).astype(np.float64)
+                rows, carry = _lagged_rows(
+                    timestamps, chunk[price_col].values.astype(np.float64),
+                    carry, lags
+                )
+                f.write(rows.tobytes())
+                n_rows += len(rows)
+
+    with open(path + ".json", "w") as f:
+        json.dump({"columns": feature_columns(lags), "rows": n_rows}, f)
+    return open_feature_memmap(path)
+
+
+def open_feature_memmap(path):
+    """
+    Memory maps a feature matrix written by write_feature_memmap.
+
+    Parameters
+    ----------
+    path : `str`
+        The feature matrix file.
+
+    Returns
+    -------
+    features : `np.memmap`
+        A read-only memory map of the feature matrix.
+    """
+    with open(path + ".json") as f:
+        layout = json.load(f)
+    shape = (layout["rows"], len(layout["columns"]))
+    if shape[0] == 0:
+        return np.empty(shape)
+    return np.memmap(path, dtype=np.float64, mode="r", shape=shape)
+
+
+def iter_batches(features, cols, start_date=None, end_date=None, batch_size=10000):
+    """
+    Streams (X, y) mini-batches from a feature matrix, optionally
+    restricted to a date range. Only one batch is copied into
+    memory at a time.
+
+    Parameters
+    ----------
+    features : `np.memmap`
+        The feature matrix.
+    cols : `list`
+        The names of the predictor columns, e.g. ['Lag1', 'Lag2'].
+    start_date : `DateTime`
+        default = None. The first date (inclusive) to include.
+    end_date : `DateTime`
+        default = None. The last date (exclusive) to include.
+    batch_size : `int`
+        default = 10000. The number of rows per batch.
+
+    Yields
+    ------
+    X : `np.ndarray`
+        The predictors of the batch.
+    y : `np.ndarray`
+        The direction of the batch.
+    """
+    lags = features.shape[1] - 3
+    names = feature_columns(lags)
+    col_idx = [names.index(c) for c in cols]
+    start = -np.inf if start_date is None else pd.Timestamp(start_date).timestamp()
+    end = np.inf if end_date is None else pd.Timestamp(end_date).timestamp()
+
+    for i in range(0, features.shape[0], batch_size):
+        batch = np.asarray(features[i:i + batch_size])
+        mask = (batch[:, 0] >= start) & (batch[:, 0] < end)
+        if mask.any():
+            yield batch[mask][:, col_idx], batch[mask][:, -1]
+
+
+def fit_out_of_core(
+    model, features, cols, classes=(-1.0, 1.0), start_date=None,
+    end_date=None, batch_size=10000, n_epochs=1
+):
+    """
+    Trains an incremental estimator on a memory mapped feature
+    matrix, one mini-batch at a time, so that peak memory is
+    bounded by the batch size rather than the history length.
+
+    Parameters
+    ----------
+    model : `sklearn estimator`
+        An estimator supporting partial_fit.
+    features : `np.memmap`
+        The feature matrix.
+    cols : `list`
+        The names of the predictor columns.
+    classes : `tuple`
+        default = (-1.0, 1.0). All of the class labels.
+    start_date : `DateTime`
+        default = None. The first date (inclusive) to train on.
+    end_date : `DateTime`
+        default = None. The last date (exclusive) to train on.
+    batch_size : `int`
+        default = 10000. The number of rows per batch.
+    n_epochs : `int`
+        default = 1. The number of passes over the training rows.
+
+    Returns
+    -------
+    model : `sklearn estimator`
+        The trained estimator.
+    """
+    classes = np.asarray(classes)
+    for epoch in range(n_epochs):
+        for X, y in iter_batches(
+            features, cols, start_date, end_date, batch_size
+        ):
+            model.partial_fit(X, y, classes=classes)
+    return model
+
+
+def evaluate_out_of_core(
+    model, features, cols, classes=(-1.0, 1.0), start_date=None,
+    end_date=None, batch_size=10000
+):
+    """
+    Streams the test rows of a memory mapped feature matrix
+    through a trained model, accumulating the hit rate and
+    confusion matrix batch by batch.
+
+    Parameters
+    ----------
+    model : `sklearn estimator`
+        The trained estimator.
+    features : `np.memmap`
+        The feature matrix.
+    cols : `list`
+        The names of the predictor columns.
+    classes : `tuple`
+        default = (-1.0, 1.0). All of the class labels.
+    start_date : `DateTime`
+        default = None. The first date (inclusive) to test on.
+    end_date : `DateTime`
+        default = None. The last date (exclusive) to test on.
+    batch_size : `int`
+        default = 10000. The number of rows per batch.
+
+    Returns
+    -------
+    hit_rate : `float`
+        The proportion of correctly predicted directions.
+    cm : `np.ndarray`
+        The confusion matrix of predictions against actuals.
+    """
+    classes = np.asarray(classes)
+    cm = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    for X, y in iter_batches(features, cols, start_date, end_date, batch_size):
+        pred = model.predict(X)
+        cm += confusion_matrix(pred, y, labels=classes)
+    total = cm.sum()
+    hit_rate = np.trace(cm) / total if total > 0 else np.nan
+    return hit_rate, cm
+
+
+if __name__ == "__main__":
+    csv_files = ["PATH/TO/YOUR/CSV"]
+    features = write_feature_memmap(csv_files, "features.dat", lags=5)
+
+    # Train on the prior two periods of returns before 2017 and
+    # test on the remainder, as in forecast.py
+    cols = ["Lag1", "Lag2"]
+    start_test = dt(2017,1,1)
+    model = fit_out_of_core(
+        SGDClassifier(loss="log_loss", alpha=1e-4), features, cols,
+        end_date=start_test, n_epochs=5
+    )
+    hit_rate, cm = evaluate_out_of_core(
+        model, features, cols, start_date=start_test
+    )
+    print("SGD:\n%0.3f" % hit_rate)
+    print("%s\n" % cm)
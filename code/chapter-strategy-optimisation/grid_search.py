@@ -2,11 +2,12 @@
 import pprint
 from datetime import datetime as dt
 
-from sklearn.model_selection import train_test_split, GridSearchCV, TimeSeriesSplit 
+from sklearn.model_selection import train_test_split, TimeSeriesSplit 
 from sklearn.metrics import classification_report
 from sklearn.svm import SVC
 
 from create_lagged_series import create_lagged_series
+from tuning import CachedGridSearch
 
 
 if __name__ == "__main__":
@@ -31,8 +32,11 @@ if __name__ == "__main__":
         {'kernel': ['rbf'], 'gamma': [1, 1e-1, 1e-2, 1e-3], 'C': [0.1, 1, 10, 100]}
     ]
 
-    # Perform the grid search on the tuned parameters
-    model = GridSearchCV(SVC(C=1), tuned_parameters, cv=TimeSeriesSplit(n_splits=3))
+    # Perform the grid search on the tuned parameters, fitting the
+    # folds in parallel and reusing any scores cached on disk
+    model = CachedGridSearch(
+        SVC(C=1), tuned_parameters, cv=TimeSeriesSplit(n_splits=3)
+    )
     model.fit(X_train, y_train)
 
     print("Optimised parameters found on training set:")
@@ -0,0 +1,159 @@
+# model_evaluation.py
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import confusion_matrix
+
+
+# Read-only views onto the shared train/test matrices, populated
+# once per worker process by the pool initialiser
+_shared_arrays = {}
+
+
+def _create_shared_array(arr):
+    """
+    Copies an array into a block of shared memory so that it
+    can be mapped by the worker processes without pickling it
+    once per model.
+
+    Parameters
+    ----------
+    arr : `np.ndarray`
+        The array to share.
+
+    Returns
+    -------
+    shm : `SharedMemory`
+        The shared memory block, owned by the calling process.
+    spec : `tuple`
+        The (name, shape, dtype) needed to attach to the block.
+    """
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+    view[:] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach_shared_arrays(specs):
+    """
+    Pool initialiser. Attaches to each shared memory block and
+    exposes it as a read-only array.
+
+    Parameters
+    ----------
+    specs : `dict`
+        Maps array names to the (name, shape, dtype) of their block.
+    """
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        # Keep a reference to the block so the mapping stays valid
+        _shared_arrays[key] = (shm, arr)
+
+
+def _fit_and_score(name, model):
+    """
+    Fits a single model on the shared training set and scores
+    it on the shared test set, timing both stages.
+
+    Parameters
+    ----------
+    name : `str`
+        The label of the model.
+    model : `sklearn estimator`
+        The unfitted model.
+
+    Returns
+    -------
+    result : `dict`
+        The hit rate, confusion matrix and fit/predict timings.
+    """
+    X_train = _shared_arrays["X_train"][1]
+    y_train = _shared_arrays["y_train"][1]
+    X_test = _shared_arrays["X_test"][1]
+    y_test = _shared_arrays["y_test"][1]
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pred = model.predict(X_test)
+    predict_time = time.perf_counter() - start
+
+    return {
+        "model": name,
+        "hit_rate": np.mean(pred == y_test),
+        "confusion_matrix": confusion_matrix(pred, y_test),
+        "fit_time": fit_time,
+        "predict_time": predict_time,
+    }
+
+
+def evaluate_models(models, X_train, y_train, X_test, y_test, max_workers=None):
+    """
+    Fits and scores every candidate model concurrently in a process
+    pool. The train and test matrices are placed in shared memory
+    once and mapped read-only by each worker, so wall-clock time
+    approaches that of the slowest single model rather than the sum.
+
+    Parameters
+    ----------
+    models : `list`
+        A list of (name, model) tuples.
+    X_train : `pd.DataFrame` or `np.ndarray`
+        The training predictors.
+    y_train : `pd.Series` or `np.ndarray`
+        The training response.
+    X_test : `pd.DataFrame` or `np.ndarray`
+        The test predictors.
+    y_test : `pd.Series` or `np.ndarray`
+        The test response.
+    max_workers : `int`
+        default = None. The number of worker processes, which
+        defaults to one per model (capped at the CPU count).
+
+    Returns
+    -------
+    results : `pd.DataFrame`
+        One row per model, in the order given, with the hit rate,
+        confusion matrix and fit/predict timings in seconds.
+    """
+    if max_workers is None:
+        max_workers = min(len(models), os.cpu_count() or 1)
+
+    arrays = {
+        "X_train": np.asarray(X_train),
+        "y_train": np.asarray(y_train),
+        "X_test": np.asarray(X_test),
+        "y_test": np.asarray(y_test),
+    }
+    blocks = []
+    specs = {}
+    try:
+        for key, arr in arrays.items():
+            shm, specs[key] = _create_shared_array(arr)
+            blocks.append(shm)
+
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_attach_shared_arrays, initargs=(specs,)
+        ) as executor:
+            futures = [
+                executor.submit(_fit_and_score, name, model)
+                for name, model in models
+            ]
+            results = [f.result() for f in futures]
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    return pd.DataFrame(results).set_index("model")
@@ -2,12 +2,11 @@
 
 from datetime import datetime as dt
 
-import pandas as pd
 from sklearn.model_selection import TimeSeriesSplit 
-from sklearn.metrics import confusion_matrix
 from sklearn.svm import SVC
 
 from create_lagged_series import create_lagged_series
+from walk_forward import walk_forward_evaluate
 
 
 if __name__ == "__main__":
@@ -25,32 +24,21 @@ if __name__ == "__main__":
     # Create a time series splitcross validation object
     ts_split = TimeSeriesSplit(n_splits=5)
 
-    # Use the ts_split object to create index arrays that
-    # state which elements have been retained for training
-    # and which elements have beenr retained for testing
-    # for each k-element iteration
-    for train_index, test_index in ts_split.split(X):
-        X_train = X.loc[X.index[train_index]]
-        X_test = X.loc[X.index[test_index]]
-        y_train = y.loc[y.index[train_index]]
-        y_test = y.loc[y.index[test_index]]
-
-        # In this instance only use the 
-        # Radial Support Vector Machine (SVM)
+    # Walk forward through the expanding training sets, reusing
+    # the kernel values computed for the previous fold rather
+    # than refitting the Radial Support Vector Machine (SVM)
+    # from scratch on every fold
+    model = SVC(
+        C=1000000.0, cache_size=200, class_weight=None,
+        coef0=0.0, degree=3, gamma=0.0001, kernel='rbf',
+        max_iter=-1, probability=False, random_state=None,
+        shrinking=True, tol=0.001, verbose=False
+    )
+    results = walk_forward_evaluate(model, X, y, ts_split)
+
+    # Output the hit-rate and the confusion matrix for each fold
+    for idx, res in results.iterrows():
         print("Hit Rate/Confusion Matrix:")
-        model = SVC(
-            C=1000000.0, cache_size=200, class_weight=None,
-            coef0=0.0, degree=3, gamma=0.0001, kernel='rbf',
-            max_iter=-1, probability=False, random_state=None,
-            shrinking=True, tol=0.001, verbose=False
-        )
-
-        # Train the model on the retained training data
-        model.fit(X_train, y_train)
-
-        # Make an array of predictions on the test set
-        pred = model.predict(X_test)
-
-        # Output the hit-rate and the confusion matrix for each model
-        print("%0.3f" % model.score(X_test, y_test))
-        print("%s\n" % confusion_matrix(pred, y_test))
+        print("%0.3f" % res["hit_rate"])
+        print("%s\n" % res["confusion_matrix"])
+    print("Total fit time: %0.3fs" % results["fit_time"].sum())
@@ -0,0 +1,263 @@
+# tuning.py
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import math
+import os
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterGrid
+
+
+# The training data for the worker processes, set once per
+# worker by the pool initialiser rather than pickled per task
+_worker_data = {}
+
+
+def _init_worker(X, y, estimator, scoring):
+    """
+    Pool initialiser. Stores the data, base estimator and
+    scoring method in the worker process.
+    """
+    _worker_data["X"] = X
+    _worker_data["y"] = y
+    _worker_data["estimator"] = estimator
+    _worker_data["scoring"] = scoring
+
+
+def _score_cell(params, train_index, test_index):
+    """
+    Fits the base estimator with a single parameter combination
+    on one training fold and scores it on the matching test fold.
+
+    Parameters
+    ----------
+    params : `dict`
+        The parameter combination to set on the estimator.
+    train_index : `np.ndarray`
+        The row indices of the training fold.
+    test_index : `np.ndarray`
+        The row indices of the test fold.
+
+    Returns
+    -------
+    score : `float`
+        The test score for the fold.
+    """
+    X = _worker_data["X"]
+    y = _worker_data["y"]
+    scoring = _worker_data["scoring"]
+    est = clone(_worker_data["estimator"]).set_params(**params)
+    est.fit(X[train_index], y[train_index])
+    if scoring is None:
+        return float(est.score(X[test_index], y[test_index]))
+    return float(get_scorer(scoring)(est, X[test_index], y[test_index]))
+
+
+class CachedGridSearch(object):
+    """
+    A drop-in replacement for the serial use of GridSearchCV. Each
+    (parameter combination, fold) cell is fitted in parallel across
+    a process pool and its score memoised on disk, so that re-running
+    a search, or extending its grid, only fits the cells that have
+    not been seen before.
+
+    Optionally the search can prune the grid by successive halving
+    over the folds. Every candidate is scored on the first fold, the
+    best 1/factor of them go on to the next fold and so on, so the
+    later (larger) training sets are only fitted for the most
+    promising candidates.
+    """
+
+    def __init__(
+        self, estimator, param_grid, cv, scoring=None,
+        n_jobs=None, cache_dir=".grid_cache"
+    ):
+        """
+        Initialises the grid search.
+
+        Parameters
+        ----------
+        estimator : `sklearn estimator`
+            The base (unfitted) estimator.
+        param_grid : `dict` or `list`
+            The parameter grid, as for GridSearchCV.
+        cv : `TimeSeriesSplit`
+            The cross-validation splitter.
+        scoring : `str`
+            default = None. An sklearn scoring name. Defaults to
+            the estimator's own score method.
+        n_jobs : `int`
+            default = None. The number of worker processes, which
+            defaults to one per CPU.
+        cache_dir : `str`
+            default = '.grid_cache'. The directory holding the
+            memoised scores.
+        """
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.cv = cv
+        self.scoring = scoring
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+
+    def _cache_path(self, X, y):
+        """
+        The cache file is keyed on the base estimator, the scoring
+        method, the splitter and a fingerprint of the data, so that
+        changing any of these cannot return stale scores. The
+        estimator is keyed on its class and full parameters rather
+        than its repr, which sklearn truncates for long parameters.
+        """
+        digest = hashlib.sha1()
+        digest.update(joblib.hash((
+            type(self.estimator),
+            sorted(self.estimator.get_params(deep=False).items()),
+            self.scoring,
+            self.cv,
+        )).encode())
+        digest.update(np.ascontiguousarray(X).tobytes())
+        digest.update(np.ascontiguousarray(y).tobytes())
+        return os.path.join(self.cache_dir, "%s.json" % digest.hexdigest())
+
+    def _load_cache(self, path):
+        """
+        Loads the memoised cell scores, if any exist.
+        """
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_cache(self, path, cache):
+        """
+        Saves the memoised cell scores.
+        """
+        # Write then rename, so an interrupted search can
+        # never leave a truncated cache file behind
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+
+    def _cell_key(self, params, fold):
+        """
+        The cache key of a single (parameter combination, fold) cell.
+        """
+        return "%s|%d" % (json.dumps(params, sort_keys=True, default=str), fold)
+
+    def _score_cells(self, executor, cells, splits, cache, path):
+        """
+        Scores the given (candidate, fold) cells, only submitting
+        those not already in the cache to the pool.
+        """
+        pending = {}
+        for params, fold in cells:
+            key = self._cell_key(params, fold)
+            if key not in cache:
+                train_index, test_index = splits[fold]
+                pending[key] = executor.submit(
+                    _score_cell, params, train_index, test_index
+                )
+        for key, future in pending.items():
+            cache[key] = future.result()
+        if pending:
+            self._save_cache(path, cache)
+        self.n_fitted_ += len(pending)
+
+    def fit(self, X, y, halving=False, factor=3):
+        """
+        Runs the search and refits the best candidate on all of
+        the data, as GridSearchCV does with refit=True.
+
+        Parameters
+        ----------
+        X : `pd.DataFrame` or `np.ndarray`
+            The predictors.
+        y : `pd.Series` or `np.ndarray`
+            The response.
+        halving : `bool`
+            default = False. Whether to prune the candidates by
+            successive halving over the folds.
+        factor : `int`
+            default = 3. Only the best 1/factor of the candidates
+            survive each halving rung.
+
+        Returns
+        -------
+        self : `CachedGridSearch`
+            The fitted search.
+        """
+        X = np.asarray(X)
+        y = np.asarray(y)
+        candidates = list(ParameterGrid(self.param_grid))
+        splits = list(self.cv.split(X))
+        path = self._cache_path(X, y)
+        cache = self._load_cache(path)
+        self.n_fitted_ = 0
+
+        # Without halving every candidate survives to the last fold
+        survivors = list(range(len(candidates)))
+        n_folds = [0] * len(candidates)
+        with ProcessPoolExecutor(
+            max_workers=self.n_jobs, initializer=_init_worker,
+            initargs=(X, y, self.estimator, self.scoring)
+        ) as executor:
+            if halving:
+                for fold in range(len(splits)):
+                    cells = [(candidates[i], fold) for i in survivors]
+                    self._score_cells(executor, cells, splits, cache, path)
+                    for i in survivors:
+                        n_folds[i] = fold + 1
+                    if fold < len(splits) - 1:
+                        survivors.sort(
+                            key=lambda i: self._mean_score(
+                                cache, candidates[i], n_folds[i]
+                            ),
+                            reverse=True
+                        )
+                        survivors = survivors[
+                            :max(1, math.ceil(len(survivors) / factor))
+                        ]
+            else:
+                cells = [
+                    (params, fold)
+                    for params in candidates for fold in range(len(splits))
+                ]
+                self._score_cells(executor, cells, splits, cache, path)
+                n_folds = [len(splits)] * len(candidates)
+
+        scores = [
+            self._mean_score(cache, params, n)
+            for params, n in zip(candidates, n_folds)
+        ]
+        self.cv_results_ = {
+            "params": candidates,
+            "mean_test_score": np.array(scores),
+            "n_folds": np.array(n_folds),
+        }
+
+        # Only candidates scored on every fold are eligible
+        best = max(survivors, key=lambda i: scores[i])
+        self.best_index_ = best
+        self.best_params_ = candidates[best]
+        self.best_score_ = scores[best]
+        self.best_estimator_ = clone(self.estimator).set_params(
+            **self.best_params_
+        )
+        self.best_estimator_.fit(X, y)
+        return self
+
+    def _mean_score(self, cache, params, n_folds):
+        """
+        The mean score of a candidate over its first n_folds folds.
+        """
+        return np.mean(
+            [cache[self._cell_key(params, fold)] for fold in range(n_folds)]
+        )
@@ -0,0 +1,216 @@
+# walk_forward.py
+
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import (
+    BaseEnsemble,
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor
+)
+from sklearn.metrics import confusion_matrix
+from sklearn.metrics.pairwise import KERNEL_PARAMS, pairwise_kernels
+from sklearn.svm import SVC
+
+
+# Ensembles whose warm start grows new members rather than
+# updating the existing ones, so cannot be warm started on
+# an expanded training set
+GROWING_ENSEMBLES = (
+    BaseEnsemble, HistGradientBoostingClassifier, HistGradientBoostingRegressor
+)
+
+
+def _is_expanding(splits):
+    """
+    Checks that every training set starts at the first row and
+    is a contiguous superset of the previous training set, as
+    produced by TimeSeriesSplit without a max_train_size.
+
+    Parameters
+    ----------
+    splits : `list`
+        A list of (train_index, test_index) tuples.
+
+    Returns
+    -------
+    expanding : `bool`
+        True if the training sets are expanding windows.
+    """
+    prev_end = 0
+    for train_index, test_index in splits:
+        end = len(train_index)
+        if end < prev_end or not np.array_equal(train_index, np.arange(end)):
+            return False
+        prev_end = end
+    return True
+
+
+def _update_method(model, expanding, cache_limit, n_max):
+    """
+    Chooses how the model is brought up to date on each fold.
+
+    Parameters
+    ----------
+    model : `sklearn estimator`
+        The unfitted model.
+    expanding : `bool`
+        Whether each training set is a superset of the last.
+    cache_limit : `int`
+        The maximum size in bytes of a precomputed kernel matrix.
+    n_max : `int`
+        The number of rows in the largest training set.
+
+    Returns
+    -------
+    method : `str`
+        One of 'partial_fit', 'warm_start', 'kernel_cache' or 'refit'.
+    """
+    if not expanding:
+        return "refit"
+    if hasattr(model, "partial_fit"):
+        return "partial_fit"
+    params = model.get_params()
+    if "warm_start" in params and not isinstance(model, GROWING_ENSEMBLES):
+        return "warm_start"
+    if isinstance(model, SVC) and params["kernel"] in KERNEL_PARAMS:
+        # gamma='scale' depends on the variance of each training
+        # set, so the kernel values cannot be reused across folds
+        if params["gamma"] != "scale" and n_max * n_max * 8 <= cache_limit:
+            return "kernel_cache"
+    return "refit"
+
+
+def _kernel_params(model):
+    """
+    Extracts the keyword arguments for pairwise_kernels that
+    reproduce the kernel of an SVC.
+
+    Parameters
+    ----------
+    model : `SVC`
+        The support vector classifier.
+
+    Returns
+    -------
+    kernel : `str`
+        The kernel name.
+    kwds : `dict`
+        The kernel parameters.
+    """
+    params = model.get_params()
+    kernel = params["kernel"]
+    kwds = {k: params[k] for k in KERNEL_PARAMS[kernel]}
+    # pairwise_kernels takes gamma=None for 1/n_features
+    if kwds.get("gamma") == "auto":
+        kwds["gamma"] = None
+    return kernel, kwds
+
+
+def walk_forward_evaluate(
+    model, X, y, ts_split, classes=None, cache_limit=2**30
+):
+    """
+    Carries out walk-forward cross-validation over the folds of
+    a time series split. Since each expanding training set is a
+    superset of the previous one, models are updated rather than
+    refitted from scratch where possible:
+
+    - Estimators with partial_fit only see the newly added rows.
+    - Estimators with warm_start begin from the previous solution.
+    - Kernel SVMs reuse the kernel matrix of the previous fold and
+      only compute the rows for the newly added observations.
+
+    Every other estimator, or any split whose training sets are
+    not expanding windows, falls back to a full refit per fold.
+
+    Parameters
+    ----------
+    model : `sklearn estimator`
+        The unfitted model. It is cloned and not modified.
+    X : `pd.DataFrame` or `np.ndarray`
+        The predictors.
+    y : `pd.Series` or `np.ndarray`
+        The response.
+    ts_split : `TimeSeriesSplit`
+        The cross-validation splitter.
+    classes : `array-like`
+        default = None. All class labels, required by the first call
+        to partial_fit. Defaults to the unique values of y.
+    cache_limit : `int`
+        default = 2**30. The maximum size in bytes of the cached
+        kernel matrix, above which SVMs fall back to a full refit.
+
+    Returns
+    -------
+    results : `pd.DataFrame`
+        One row per fold with the training set size, update method,
+        hit rate, confusion matrix and fit/predict timings.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    splits = list(ts_split.split(X))
+    n_max = max(len(train_index) for train_index, _ in splits)
+    method = _update_method(
+        model, _is_expanding(splits), cache_limit, n_max
+    )
+
+    est = clone(model)
+    if method == "partial_fit" and classes is None:
+        classes = np.unique(y)
+    if method == "warm_start":
+        est.set_params(warm_start=True)
+    if method == "kernel_cache":
+        kernel, kwds = _kernel_params(est)
+        est.set_params(kernel="precomputed")
+        gram = np.empty((n_max, n_max))
+
+    results = []
+    n_seen = 0
+    for train_index, test_index in splits:
+        n_train = len(train_index)
+        start = time.perf_counter()
+        if method == "partial_fit":
+            # Only pass the rows added since the previous fold
+            est.partial_fit(
+                X[n_seen:n_train], y[n_seen:n_train], classes=classes
+            )
+        elif method == "warm_start":
+            est.fit(X[:n_train], y[:n_train])
+        elif method == "kernel_cache":
+            # Extend the cached kernel matrix by the new rows only
+            block = pairwise_kernels(
+                X[n_seen:n_train], X[:n_train], metric=kernel, **kwds
+            )
+            gram[n_seen:n_train, :n_train] = block
+            gram[:n_seen, n_seen:n_train] = block[:, :n_seen].T
+            est.fit(gram[:n_train, :n_train], y[:n_train])
+        else:
+            est = clone(model)
+            est.fit(X[train_index], y[train_index])
+        fit_time = time.perf_counter() - start
+        n_seen = n_train
+
+        start = time.perf_counter()
+        if method == "kernel_cache":
+            pred = est.predict(
+                pairwise_kernels(
+                    X[test_index], X[:n_train], metric=kernel, **kwds
+                )
+            )
+        else:
+            pred = est.predict(X[test_index])
+        predict_time = time.perf_counter() - start
+
+        results.append({
+            "train_size": n_train,
+            "test_size": len(test_index),
+            "method": method,
+            "hit_rate": np.mean(pred == y[test_index]),
+            "confusion_matrix": confusion_matrix(pred, y[test_index]),
+            "fit_time": fit_time,
+            "predict_time": predict_time,
+        })
+    return pd.DataFrame(results)
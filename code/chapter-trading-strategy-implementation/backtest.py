@@ -1,20 +1,133 @@
 # backtest.py
 
+import copy
+import os
+import pickle
 import pprint
 import queue
+import sys
 import time
 
+from scheduler import EventScheduler, SimulatedClock
+from telemetry import ProgressReporter, total_bars, trade_logger
+
+
+def _split_spec(spec):
+    """
+    Splits a strategy given as a class or a (class, params)
+    tuple into the class and its keyword arguments.
+    """
+    return spec if isinstance(spec, tuple) else (spec, {})
+
+
+def _strategy_name(strategy_cls, strategy_params):
+    """
+    Names a strategy by its class and keyword arguments.
+    """
+    name = strategy_cls.__name__
+    if strategy_params:
+        name += "(%s)" % ", ".join(
+            "%s=%s" % kv for kv in sorted(strategy_params.items())
+        )
+    return name
+
+
+class StrategySandbox(object):
+    """
+    Holds a single strategy together with its own event queue,
+    portfolio and execution handler. Several sandboxes can then
+    trade independently of each other while sharing one pass
+    over the market data.
+    """
+
+    def __init__(
+        self, name, events, strategy, portfolio, execution_handler,
+        journal=None, index=0
+    ):
+        """
+        Initialises the sandbox.
+
+        Parameters:
+        name - A name identifying the strategy in the results.
+        events - The sandbox's own Event Queue.
+        strategy - The Strategy instance.
+        portfolio - The Portfolio instance.
+        execution_handler - The ExecutionHandler instance.
+        journal - An optional EventJournal to record the events to.
+        index - The index of the sandbox in the journal.
+        """
+        self.name = name
+        self.events = events
+        self.strategy = strategy
+        self.portfolio = portfolio
+        self.execution_handler = execution_handler
+        self.journal = journal
+        self.index = index
+
+        self.signals = 0
+        self.orders = 0
+        self.fills = 0
+
+    def handle_events(self):
+        """
+        Handles the events in the sandbox's queue
+        until none are left for the current bar.
+        """
+        while True:
+            try:
+                event = self.events.get(False)
+            except queue.Empty:
+                break
+            else:
+                if event is not None:
+                    if event.type == 'MARKET':
+                        self.execution_handler.match_orders(event)
+                        self.strategy.calculate_signals(event)
+                        self.portfolio.update_timeindex(event)
+                        if self.journal is not None:
+                            self.journal.record_bar(
+                                self.index, self.portfolio.last_snapshot
+                            )
+
+                    elif event.type == 'SIGNAL':
+                        self.signals += 1
+                        self.portfolio.update_signal(event)
+
+                    elif event.type == 'ORDER':
+                        self.orders += 1
+                        self.execution_handler.execute_order(event)
+
+                    elif event.type == 'FILL':
+                        self.fills += 1
+                        self.portfolio.update_fill(event)
+                        trade_logger.info(
+                            "%s %s: FILL %s %s %s @ %s, commission %0.2f",
+                            event.timeindex, self.name, event.direction,
+                            event.quantity, event.symbol, event.fill_cost,
+                            event.commission
+                        )
+
+                    if self.journal is not None:
+                        self.journal.record(self.index, event)
+
 
 class Backtest(object):
     """
     Enscapsulates the settings and components for carrying out
     an event-driven backtest.
+
+    Any number of strategies can be run side by side from a single
+    pass over the data, each in its own StrategySandbox, so that the
+    cost of reading the bars is only paid once.
     """
 
     def __init__(
         self, csv_dir, symbol_list, initial_capital,
         heartbeat, start_date, data_handler, 
-        execution_handler, portfolio, strategy
+        execution_handler, portfolio, strategy, event_delays=None,
+        execution_params=None, portfolio_params=None, checkpointer=None,
+        journal=None, instrumentation=None, progress_interval=10.0,
+        memory_profiler=None
     ):
         """
         Initialises the backtest.
@@ -28,7 +141,28 @@ class Backtest(object):
         data_handler - (Class) Handles the market data feed.
         execution_handler - (Class) Handles the orders/fills for trades.
         portfolio - (Class) Keeps track of portfolio current and prior positions.
-        strategy - (Class) Generates signals based on market data.
+        strategy - (Class) Generates signals based on market data, or
+            a list of them to run side by side. Each can also be given
+            as a (class, params) tuple of the class and its keyword
+            arguments, e.g. (MovingAverageCrossStrategy, {'long_window': 200}).
+        event_delays - Optional delays, in bars, of each event type,
+            e.g. {'FILL': 1} to fill orders on the following bar.
+        execution_params - Optional keyword arguments for the
+            execution handler, e.g. {'fill_on_next_open': True}.
+        portfolio_params - Optional keyword arguments for the
+            portfolio, e.g. {'record': 'session'}.
+        checkpointer - An optional Checkpointer to periodically
+            checkpoint the backtest with, so it can be resumed.
+        journal - An optional EventJournal to record every signal,
+            order and fill, and the value of each portfolio per bar,
+            to. The run can then be replayed with replay_journal.
+        instrumentation - An optional Instrumentation to time the
+            handlers of the backtest with.
+        progress_interval - The minimum number of seconds between
+            progress reports, which are logged at INFO level to the
+            'backtest.progress' logger (see configure_telemetry).
+        memory_profiler - An optional MemoryProfiler to measure the
+            memory held by each component with.
         """
         self.csv_dir = csv_dir
         self.symbol_list = symbol_list
@@ -39,16 +173,28 @@ class Backtest(object):
         self.data_handler_cls = data_handler
         self.execution_handler_cls = execution_handler
         self.portfolio_cls = portfolio
-        self.strategy_cls = strategy
+        self.strategy_specs = strategy if isinstance(strategy, list) else [strategy]
+        self.execution_params = execution_params or {}
+        self.portfolio_params = portfolio_params or {}
+
+        self.event_delays = event_delays
+        self.checkpointer = checkpointer
+        self.journal = journal
+        self.instrumentation = instrumentation
+        self.memory_profiler = memory_profiler
+
+        # The data handler's queue, from which the market
+        # events are passed on to every sandbox
+        self.clock = SimulatedClock(self.start_date)
+        self.events = EventScheduler(self.clock)
+
+        self.num_strats = len(self.strategy_specs)
+        self.heartbeats = 0
 
-        self.events = queue.Queue()
-        
-        self.signals = 0
-        self.orders = 0
-        self.fills = 0
-        self.num_strats = 1
-       
         self._generate_trading_instances()
+        self.progress = ProgressReporter(
+            total_bars(self.data_handler), progress_interval
+        )
 
     def _generate_trading_instances(self):
         """
@@ -59,71 +205,280 @@ class Backtest(object):
             "Creating DataHandler, Strategy, Portfolio and ExecutionHandler"
         )
         self.data_handler = self.data_handler_cls(self.events, self.csv_dir, self.symbol_list)
-        self.strategy = self.strategy_cls(self.data_handler, self.events)
-        self.portfolio = self.portfolio_cls(self.data_handler, self.events, self.start_date, 
-                                            self.initial_capital)
-        self.execution_handler = self.execution_handler_cls(self.events)
 
-    def _run_backtest(self):
+        self.sandboxes = []
+        for i, spec in enumerate(self.strategy_specs):
+            strategy_cls, strategy_params = _split_spec(spec)
+            name = _strategy_name(strategy_cls, strategy_params)
+
+            # Each portfolio needs its own equity curve file
+            portfolio_params = dict(self.portfolio_params)
+            if self.num_strats > 1:
+                if 'equity_writer' in portfolio_params:
+                    raise ValueError(
+                        "An equity_writer cannot be shared between strategies"
+                    )
+                portfolio_params['equity_csv'] = 'equity_%d.csv' % i
+
+            events = EventScheduler(self.clock, self.event_delays)
+            self.sandboxes.append(StrategySandbox(
+                name, events,
+                strategy_cls(self.data_handler, events, **strategy_params),
+                self.portfolio_cls(
+                    self.data_handler, events, self.start_date,
+                    self.initial_capital, **portfolio_params
+                ),
+                self.execution_handler_cls(
+                    self.data_handler, events, **self.execution_params
+                ),
+                self.journal, i
+            ))
+
+        self._set_lookback()
+
+        # The components of the first (often the only) strategy
+        self.strategy = self.sandboxes[0].strategy
+        self.portfolio = self.sandboxes[0].portfolio
+        self.execution_handler = self.sandboxes[0].execution_handler
+
+        if self.journal is not None:
+            self.journal.start(self)
+        if self.instrumentation is not None:
+            self.instrumentation.attach(self)
+
+    def _set_lookback(self, variants=None):
         """
-        Executes the backtest.
+        Bounds the bars the data handler keeps to the greatest
+        lookback of the strategies, unless any needs every bar.
+        The portfolios and execution handlers only ever need the
+        latest bar.
+
+        Given the variants of a forked run, the lookback also covers
+        the strategies with each variant's attributes set, so that
+        the bars a variant needs are kept through the shared prefix.
         """
-        i = 0
-        while True:
-            i += 1
-            print(i)
+        lookbacks = []
+        for sandbox in self.sandboxes:
+            for variant in [{}] + list(variants or []):
+                strategy = copy.copy(sandbox.strategy)
+                for attr, value in variant.items():
+                    setattr(strategy, attr, value)
+                lookbacks.append(strategy.max_lookback)
+        self.data_handler.set_lookback(
+            None if None in lookbacks else max(lookbacks + [1])
+        )
+
+    @property
+    def signals(self):
+        return sum(sb.signals for sb in self.sandboxes)
+
+    @property
+    def orders(self):
+        return sum(sb.orders for sb in self.sandboxes)
+
+    @property
+    def fills(self):
+        return sum(sb.fills for sb in self.sandboxes)
+
+    def _run_backtest(self, max_heartbeats=None):
+        """
+        Executes the backtest, either to the end of the data or
+        until max_heartbeats heartbeats have been run in total, in
+        which case it can be resumed by calling it again.
+        """
+        if self.instrumentation is not None:
+            self.instrumentation.start()
+        if self.memory_profiler is not None:
+            self.memory_profiler.start(self)
+        try:
+            self._run_heartbeats(max_heartbeats)
+        finally:
+            if self.instrumentation is not None:
+                self.instrumentation.stop()
+            if self.memory_profiler is not None:
+                self.memory_profiler.stop(self)
+
+    def _run_heartbeats(self, max_heartbeats):
+        """
+        Runs the heartbeats of the backtest loop.
+        """
+        while max_heartbeats is None or self.heartbeats < max_heartbeats:
+            self.heartbeats += 1
             # Update the market bars
             if self.data_handler.continue_backtest == True:
+                self.clock.advance()
                 self.data_handler.update_bars()
+                self.clock.set_datetime(
+                    self.data_handler.get_latest_bar_datetime(self.symbol_list[0])
+                )
             else:
                 break
 
-            # Handle the events
+            # Pass the market events on to every strategy
             while True:
                 try:
                     event = self.events.get(False)
                 except queue.Empty:
                     break
                 else:
-                    if event is not None:
-                        if event.type == 'MARKET':
-                            self.strategy.calculate_signals(event)
-                            self.portfolio.update_timeindex(event)
+                    for sandbox in self.sandboxes:
+                        sandbox.events.put(event)
 
-                        elif event.type == 'SIGNAL':
-                            self.signals += 1                            
-                            self.portfolio.update_signal(event)
+            # Handle the events
+            for sandbox in self.sandboxes:
+                sandbox.handle_events()
 
-                        elif event.type == 'ORDER':
-                            self.orders += 1
-                            self.execution_handler.execute_order(event)
+            if self.checkpointer is not None and \
+                    self.heartbeats % self.checkpointer.every == 0:
+                self.checkpointer.save(self)
 
-                        elif event.type == 'FILL':
-                            self.fills += 1
-                            self.portfolio.update_fill(event)
+            if self.memory_profiler is not None and \
+                    self.heartbeats % self.memory_profiler.every == 0:
+                self.memory_profiler.sample(self)
 
-            time.sleep(self.heartbeat)
+            self.progress.update(self.heartbeats, self._queue_depth)
+
+            if self.heartbeat > 0:
+                time.sleep(self.heartbeat)
+
+    def _queue_depth(self):
+        """
+        The number of events waiting in the queues.
+        """
+        return self.events.qsize() + sum(sb.events.qsize() for sb in self.sandboxes)
 
     def _output_performance(self):
         """
-        Outputs the strategy performance from the backtest.
+        Outputs the performance of each strategy from the backtest,
+        keeping the summary stats of each in results.
         """
-        self.portfolio.create_equity_curve_dataframe()
-        
-        print("Creating summary stats...")
-        stats = self.portfolio.output_summary_stats()
-        
-        print("Creating equity curve...")
-        print(self.portfolio.equity_curve.tail(10))
-        pprint.pprint(stats)
+        self.results = []
+        for sandbox in self.sandboxes:
+            portfolio = sandbox.portfolio
+            if self.num_strats > 1:
+                print("Strategy: %s" % sandbox.name)
+            portfolio.create_equity_curve_dataframe()
+
+            print("Creating summary stats...")
+            stats = portfolio.output_summary_stats()
+            self.results.append((sandbox.name, stats))
 
-        print("Signals: %s" % self.signals)
-        print("Orders: %s" % self.orders)
-        print("Fills: %s" % self.fills)
+            print("Creating equity curve...")
+            print(portfolio.equity_curve.tail(10))
+            pprint.pprint(stats)
+
+            print("Signals: %s" % sandbox.signals)
+            print("Orders: %s" % sandbox.orders)
+            print("Fills: %s" % sandbox.fills)
+
+        if self.instrumentation is not None:
+            self.instrumentation.output()
+        if self.memory_profiler is not None:
+            self.memory_profiler.output()
 
     def simulate_trading(self):
         """
         Simulates the backtest and outputs portfolio performance.
         """
         self._run_backtest()
+        if self.journal is not None:
+            self.journal.close()
         self._output_performance()
+
+    def simulate_forked(self, variants, fork_at):
+        """
+        Simulates several variants of the strategies that only
+        differ after a shared prefix, such as the warm-up period
+        before a lookback window fills. The prefix is simulated once,
+        after which the process is forked (copy-on-write) into one
+        child per variant. Each child sets its variant's attributes
+        on the strategies, runs the rest of the backtest and sends
+        its summary stats back through a pipe.
+
+        It is up to the caller to choose a fork point at which the
+        variants would not yet have behaved differently. Requires
+        os.fork, so is not available on Windows.
+
+        Parameters:
+        variants - A list of dictionaries of strategy attributes,
+            e.g. [{'short_window': 50}, {'short_window': 100}].
+        fork_at - The number of heartbeats to run before forking.
+
+        Returns:
+        A list of (variant, results) tuples, where results is a list
+        of (strategy name, stats) tuples as in Backtest.results.
+        """
+        for sandbox in self.sandboxes:
+            if getattr(sandbox.portfolio, 'equity_writer', None) is not None:
+                raise ValueError(
+                    "An equity_writer cannot be shared between forked variants"
+                )
+
+        # Keep enough bars through the prefix for every variant,
+        # each of which then narrows the lookback to its own
+        self._set_lookback(variants)
+        self._run_backtest(max_heartbeats=fork_at)
+
+        children = []
+        for i, variant in enumerate(variants):
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                self._run_forked_variant(i, variant, write_fd)
+            os.close(write_fd)
+            children.append((pid, read_fd))
+
+        forked_results = []
+        for variant, (pid, read_fd) in zip(variants, children):
+            with os.fdopen(read_fd, 'rb') as f:
+                status, results = pickle.loads(f.read())
+            os.waitpid(pid, 0)
+            if status != 'ok':
+                raise RuntimeError(
+                    "Variant %s failed: %s" % (variant, results)
+                )
+            forked_results.append((variant, results))
+        return forked_results
+
+    def _run_forked_variant(self, i, variant, write_fd):
+        """
+        Runs a single variant in a forked child process, writing
+        its results to the pipe before exiting.
+        """
+        # Reported should the variant die before producing a result
+        message = pickle.dumps(('error', 'variant %d did not complete' % i))
+        try:
+            results = []
+            # The checkpoint and journal belong to the parent
+            self.checkpointer = None
+            for sandbox in self.sandboxes:
+                sandbox.journal = None
+            for sandbox, spec in zip(self.sandboxes, self.strategy_specs):
+                for attr, value in variant.items():
+                    setattr(sandbox.strategy, attr, value)
+                strategy_cls, strategy_params = _split_spec(spec)
+                sandbox.name = _strategy_name(
+                    strategy_cls, dict(strategy_params, **variant)
+                )
+                root, ext = os.path.splitext(sandbox.portfolio.equity_csv)
+                sandbox.portfolio.equity_csv = "%s_v%d%s" % (root, i, ext)
+            # Narrow the lookback to the variant's own
+            self._set_lookback()
+            self._run_backtest()
+            for sandbox in self.sandboxes:
+                sandbox.portfolio.create_equity_curve_dataframe()
+                stats = sandbox.portfolio.output_summary_stats()
+                results.append((sandbox.name, stats))
+            message = pickle.dumps(('ok', results))
+        except BaseException as e:
+            message = pickle.dumps(('error', repr(e)))
+        finally:
+            try:
+                with os.fdopen(write_fd, 'wb') as f:
+                    f.write(message)
+                sys.stdout.flush()
+            finally:
+                # Skip the parent's cleanup handlers, whatever happens,
+                # so the child never returns into the parent's code
+                os._exit(0)
@@ -0,0 +1,354 @@
+# benchmark.py
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from backtest import Backtest
+from buyhold import BuyAndHoldStrategy
+from data import HistoricCSVDataHandler
+from execution import SimulatedExecutionHandler
+from hft_data import HistoricCSVDataHandlerHFT
+from hft_portfolio import PortfolioHFT
+from instrumentation import Instrumentation
+from intraday_mr import IntradayOLSMRStrategy
+from mac import MovingAverageCrossStrategy
+from portfolio import Portfolio
+
+
+class InMemoryCSVDataHandler(HistoricCSVDataHandler):
+    """
+    Reads the daily bars from CSV text held in memory, given as a
+    dictionary of symbol to text in place of the CSV directory, so
+    that the benchmark does not measure the disk.
+    """
+
+    def _csv_source(self, symbol):
+        return io.StringIO(self.csv_dir[symbol])
+
+
+class InMemoryCSVDataHandlerHFT(HistoricCSVDataHandlerHFT):
+    """
+    Reads the minutely bars from CSV text held in memory.
+    """
+
+    def _csv_source(self, symbol):
+        return io.StringIO(self.csv_dir[symbol])
+
+
+def generate_prices(symbols, bars, seed=42):
+    """
+    Generates correlated random walk prices, a common market
+    factor plus noise per symbol, so that pairs of symbols
+    mean revert against each other.
+
+    Parameters:
+    symbols - The number of symbols.
+    bars - The number of bars per symbol.
+    seed - The random seed, for reproducible data.
+    """
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0.0002, 0.01, bars)
+    prices = []
+    for i in range(symbols):
+        beta = rng.uniform(0.8, 1.2)
+        noise = rng.normal(0.0, 0.005, bars)
+        prices.append(
+            rng.uniform(20.0, 200.0) * np.exp(np.cumsum(beta * market + noise))
+        )
+    return rng, prices
+
+
+def generate_daily_csvs(symbols, bars, seed=42):
+    """
+    Returns synthetic daily OHLCV bars as a dictionary of symbol
+    to CSV text, in the format read by HistoricCSVDataHandler.
+    """
+    rng, prices = generate_prices(symbols, bars, seed)
+    index = pd.bdate_range('2000-01-03', periods=bars, name='datetime')
+    csvs = {}
+    for i, close in enumerate(prices):
+        spread = close * rng.uniform(0.0, 0.01, bars)
+        open_ = close * (1.0 + rng.normal(0.0, 0.003, bars))
+        csvs['SYM%d' % i] = pd.DataFrame({
+            'open': open_,
+            'high': np.maximum(open_, close) + spread,
+            'low': np.minimum(open_, close) - spread,
+            'close': close,
+            'adj_close': close,
+            'volume': rng.integers(100000, 1000000, bars),
+        }, index=index).to_csv()
+    return csvs
+
+
+def generate_minute_csvs(symbols, bars, seed=42):
+    """
+    Returns synthetic minutely bars, over the 09:30 to 16:00
+    sessions of consecutive business days, as a dictionary of
+    symbol to CSV text in the format read by HistoricCSVDataHandlerHFT.
+    """
+    rng, prices = generate_prices(symbols, bars, seed)
+    days = pd.bdate_range('2022-01-10', periods=bars // 390 + 1)
+    index = pd.DatetimeIndex(
+        [
+            day + pd.Timedelta(hours=9, minutes=30) + pd.Timedelta(minutes=m)
+            for day in days for m in range(390)
+        ][:bars], name='datetime'
+    )
+    csvs = {}
+    for i, close in enumerate(prices):
+        spread = close * rng.uniform(0.0, 0.002, bars)
+        open_ = close * (1.0 + rng.normal(0.0, 0.0005, bars))
+        csvs['SYM%d' % i] = pd.DataFrame({
+            'volume': rng.integers(100, 10000, bars),
+            'vw_av_price': (open_ + close) / 2.0,
+            'open': open_,
+            'close': close,
+            'high': np.maximum(open_, close) + spread,
+            'low': np.minimum(open_, close) - spread,
+            'num_trans': rng.integers(1, 100, bars),
+        }, index=index).to_csv()
+    return csvs
+
+
+# The benchmarked strategies, as the data they run on and the
+# components and parameters of their backtest
+CASES = {
+    'buyhold': {
+        'data': generate_daily_csvs,
+        'data_handler': (HistoricCSVDataHandler, InMemoryCSVDataHandler),
+        'portfolio': Portfolio,
+        'strategy': BuyAndHoldStrategy,
+        'execution_params': {},
+    },
+    'mac': {
+        'data': generate_daily_csvs,
+        'data_handler': (HistoricCSVDataHandler, InMemoryCSVDataHandler),
+        'portfolio': Portfolio,
+        'strategy': MovingAverageCrossStrategy,
+        'execution_params': {},
+    },
+    'intraday_mr': {
+        'data': generate_minute_csvs,
+        'data_handler': (HistoricCSVDataHandlerHFT, InMemoryCSVDataHandlerHFT),
+        'portfolio': PortfolioHFT,
+        'strategy': IntradayOLSMRStrategy,
+        'execution_params': {'price_type': 'close'},
+    },
+}
+
+
+def peak_rss_mb():
+    """
+    The peak resident set size of this process in megabytes,
+    or None where the resource module is unavailable.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, kilobytes elsewhere
+    return rss / (1024.0 ** 2 if sys.platform == 'darwin' else 1024.0)
+
+
+def run_case(name, symbols, bars, in_memory=False, seed=42):
+    """
+    Runs a single benchmark case, returning its measurements.
+    Meant to be called in a fresh process, so that the peak RSS
+    is that of the case alone.
+
+    Parameters:
+    name - The name of the case in CASES.
+    symbols - The number of symbols.
+    bars - The number of bars per symbol.
+    in_memory - Whether to read the CSV text from memory
+        rather than from files on disk.
+    seed - The random seed of the synthetic data.
+    """
+    case = CASES[name]
+    csvs = case['data'](symbols, bars, seed)
+    # Run in a scratch directory, as the portfolio writes its
+    # equity curve to the working directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as workdir:
+        os.chdir(workdir)
+        try:
+            if in_memory:
+                csv_dir = csvs
+                data_handler = case['data_handler'][1]
+            else:
+                csv_dir = workdir
+                data_handler = case['data_handler'][0]
+                for symbol, text in csvs.items():
+                    with open(os.path.join(workdir, '%s.csv' % symbol), 'w') as f:
+                        f.write(text)
+            start_date = pd.Timestamp(pd.read_csv(
+                io.StringIO(csvs['SYM0']), nrows=1, index_col=0, parse_dates=True
+            ).index[0]).to_pydatetime()
+
+            instrumentation = Instrumentation()
+            with contextlib.redirect_stdout(io.StringIO()):
+                t = time.perf_counter()
+                backtest = Backtest(
+                    csv_dir, sorted(csvs), 100000.0, 0.0, start_date,
+                    data_handler, SimulatedExecutionHandler, case['portfolio'],
+                    case['strategy'], execution_params=case['execution_params'],
+                    instrumentation=instrumentation
+                )
+                load = time.perf_counter() - t
+
+                t = time.perf_counter()
+                backtest._run_backtest()
+                loop = time.perf_counter() - t
+
+                t = time.perf_counter()
+                backtest.portfolio.create_equity_curve_dataframe()
+                backtest.portfolio.output_summary_stats()
+                output = time.perf_counter() - t
+        finally:
+            os.chdir(cwd)
+
+    phases = {'load': load}
+    for row in instrumentation.breakdown():
+        phases[row['handler']] = row['wall']
+    phases['output'] = output
+
+    # One market event per bar, plus the signals, orders and fills
+    events = bars + backtest.signals + backtest.orders + backtest.fills
+    return {
+        'case': name, 'symbols': symbols, 'bars': bars,
+        'in_memory': in_memory, 'wall': load + loop + output,
+        'bars_per_sec': bars / loop, 'events_per_sec': events / loop,
+        'peak_rss_mb': peak_rss_mb(),
+        'signals': backtest.signals, 'orders': backtest.orders,
+        'fills': backtest.fills, 'phases': phases,
+    }
+
+
+def run_isolated(name, symbols, bars, in_memory=False, seed=42):
+    """
+    Runs a benchmark case in a fresh worker process.
+    """
+    with multiprocessing.Pool(processes=1) as pool:
+        return pool.apply(run_case, (name, symbols, bars, in_memory, seed))
+
+
+def git_commit():
+    """
+    The current git commit, if any, to label the results with.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def output_results(results):
+    """
+    Prints the measurements and per-phase time split of each case.
+    """
+    print("%-12s %8s %8s %12s %12s %10s %10s" % (
+        "Case", "Symbols", "Bars", "Bars/s", "Events/s", "Wall (s)", "RSS (MB)"
+    ))
+    for r in results:
+        print("%-12s %8d %8d %12.0f %12.0f %10.2f %10s" % (
+            r['case'], r['symbols'], r['bars'], r['bars_per_sec'],
+            r['events_per_sec'], r['wall'],
+            "-" if r['peak_rss_mb'] is None else "%0.1f" % r['peak_rss_mb']
+        ))
+    for r in results:
+        print("\n%s phases:" % r['case'])
+        for phase, seconds in sorted(r['phases'].items(), key=lambda kv: -kv[1]):
+            print("  %-40s %8.3fs %6.1f%%" % (
+                phase, seconds, 100.0 * seconds / r['wall']
+            ))
+
+
+def compare_results(baseline, results, tolerance=0.1):
+    """
+    Compares results against a baseline, printing the change in
+    throughput and peak RSS of each case run at the same size.
+    Returns the cases which have regressed by more than the
+    tolerance, as a fraction.
+    """
+    base = dict(
+        ((r['case'], r['symbols'], r['bars'], r['in_memory']), r)
+        for r in baseline['results']
+    )
+    regressions = []
+    print("\nCompared to %s (%s):" % (
+        baseline.get('commit') or 'baseline', baseline.get('date')
+    ))
+    for r in results:
+        old = base.get((r['case'], r['symbols'], r['bars'], r['in_memory']))
+        if old is None:
+            print("  %-12s no baseline at this size" % r['case'])
+            continue
+        speed = r['bars_per_sec'] / old['bars_per_sec'] - 1.0
+        rss = None
+        if r['peak_rss_mb'] and old['peak_rss_mb']:
+            rss = r['peak_rss_mb'] / old['peak_rss_mb'] - 1.0
+        regressed = speed < -tolerance or (rss is not None and rss > tolerance)
+        print("  %-12s bars/s %+6.1f%%, peak RSS %s%s" % (
+            r['case'], 100.0 * speed,
+            "-" if rss is None else "%+0.1f%%" % (100.0 * rss),
+            "  REGRESSION" if regressed else ""
+        ))
+        if regressed:
+            regressions.append(r['case'])
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the event-driven backtester on synthetic data."
+    )
+    parser.add_argument('--cases', nargs='+', default=sorted(CASES), choices=sorted(CASES))
+    parser.add_argument('--symbols', type=int, default=2)
+    parser.add_argument('--bars', type=int, default=2000)
+    parser.add_argument('--in-memory', action='store_true',
+                        help="read the CSV text from memory rather than disk")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help="save the results as a JSON baseline")
+    parser.add_argument('--compare', help="compare against a JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="the fractional slowdown or RSS growth flagged")
+    args = parser.parse_args()
+
+    results = [
+        run_isolated(name, args.symbols, args.bars, args.in_memory, args.seed)
+        for name in args.cases
+    ]
+    output_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'date': pd.Timestamp.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'results': results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare_results(baseline, results, args.tolerance):
+            sys.exit(1)
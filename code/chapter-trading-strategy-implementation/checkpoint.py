@@ -0,0 +1,128 @@
+# checkpoint.py
+
+import os
+import pickle
+
+
+class Checkpointer(object):
+    """
+    Periodically checkpoints a running Backtest, so that a long
+    backtest can be resumed from its last checkpoint after a crash
+    rather than started over.
+
+    A checkpoint is in two parts. The snapshot is a pickle of the
+    whole backtest (data cursors, strategy state, portfolios, pending
+    events and counters), leaving out the market data, which is read
+    from the CSV files again on resume, and the portfolio ledgers. The
+    ledgers (all_positions and all_holdings) only ever grow, so each
+    checkpoint just appends the records added since the previous one
+    to a separate ledger file, instead of rewriting them all.
+
+    The snapshot is written to a temporary file and then renamed, so
+    a crash while checkpointing leaves the previous checkpoint intact.
+    """
+
+    def __init__(self, path, every=10000):
+        """
+        Initialises the checkpointer.
+
+        Parameters:
+        path - The snapshot file. The ledgers are appended
+            to path + '.ledger'.
+        every - The number of heartbeats between checkpoints.
+        """
+        self.path = path
+        self.ledger_path = path + '.ledger'
+        self.every = every
+
+        # How far the ledgers of each portfolio have been written,
+        # and the size of the ledger file as of the last snapshot
+        self.ledger_rows = {}
+        self.ledger_size = 0
+
+        # A new run starts a new ledger
+        if os.path.exists(self.ledger_path):
+            os.remove(self.ledger_path)
+
+    def _append_ledgers(self, backtest):
+        """
+        Appends the ledger records added since the last checkpoint.
+        """
+        with open(self.ledger_path, 'ab') as f:
+            for i, sandbox in enumerate(backtest.sandboxes):
+                portfolio = sandbox.portfolio
+                n_pos, n_hold = self.ledger_rows.get(i, (0, 0))
+                positions = portfolio.all_positions[n_pos:]
+                holdings = portfolio.all_holdings[n_hold:]
+                if positions or holdings:
+                    pickle.dump(
+                        (i, positions, holdings), f,
+                        protocol=pickle.HIGHEST_PROTOCOL
+                    )
+                self.ledger_rows[i] = (
+                    len(portfolio.all_positions), len(portfolio.all_holdings)
+                )
+            self.ledger_size = f.tell()
+
+    def save(self, backtest):
+        """
+        Checkpoints the backtest.
+
+        Parameters:
+        backtest - The Backtest to checkpoint.
+        """
+        for sandbox in backtest.sandboxes:
+            if getattr(sandbox.portfolio, 'equity_writer', None) is not None:
+                raise ValueError(
+                    "A backtest streaming its equity curve cannot be checkpointed"
+                )
+
+        self._append_ledgers(backtest)
+
+        # Leave the ledgers out of the snapshot while pickling it
+        ledgers = []
+        for sandbox in backtest.sandboxes:
+            portfolio = sandbox.portfolio
+            ledgers.append((portfolio.all_positions, portfolio.all_holdings))
+            portfolio.all_positions = []
+            portfolio.all_holdings = []
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(backtest, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        finally:
+            for sandbox, (positions, holdings) in zip(backtest.sandboxes, ledgers):
+                sandbox.portfolio.all_positions = positions
+                sandbox.portfolio.all_holdings = holdings
+
+    def _restore_ledgers(self, backtest):
+        """
+        Reads the ledgers back into the portfolios, discarding
+        anything appended after the snapshot was taken.
+        """
+        for sandbox in backtest.sandboxes:
+            sandbox.portfolio.all_positions = []
+            sandbox.portfolio.all_holdings = []
+
+        with open(self.ledger_path, 'r+b') as f:
+            f.truncate(self.ledger_size)
+            while f.tell() < self.ledger_size:
+                i, positions, holdings = pickle.load(f)
+                portfolio = backtest.sandboxes[i].portfolio
+                portfolio.all_positions.extend(positions)
+                portfolio.all_holdings.extend(holdings)
+
+
+def resume_backtest(path):
+    """
+    Restores a Backtest from its last checkpoint. Calling its
+    simulate_trading method then continues the run from there.
+
+    Parameters:
+    path - The snapshot file given to the Checkpointer.
+    """
+    with open(path, 'rb') as f:
+        backtest = pickle.load(f)
+    backtest.checkpointer._restore_ledgers(backtest)
+    return backtest
@@ -0,0 +1,134 @@
+# commission.py
+
+import numpy as np
+import pandas as pd
+
+
+class CommissionModel(object):
+    """
+    A tiered commission and fee schedule, evaluated with numpy so
+    that the same model prices a single fill or a whole array of
+    fills in one call, without any per-trade Python branching.
+
+    The brokerage commission of a fill is its per-share rate times
+    the quantity, plus a per-value rate times the trade value, which
+    is then held between the minimum and the maximum (a percentage of
+    the trade value). Exchange fees per share and regulatory fees on
+    the value of sales are added on top.
+
+    The per-share rate can be tiered, either on the size of the fill
+    itself or on the volume already traded that month.
+    """
+
+    def __init__(
+        self, per_share=0.0, per_value=0.0, minimum=0.0, max_pct=None,
+        exchange_fee=0.0, sell_fee=0.0, tiers=None, tier_on="monthly_volume"
+    ):
+        """
+        Initialises the commission model.
+
+        Parameters:
+        per_share - The commission per share, when untiered.
+        per_value - The commission as a fraction of the trade value.
+        minimum - The minimum commission per fill.
+        max_pct - The maximum commission as a fraction of the trade
+            value, or None for no maximum.
+        exchange_fee - The exchange fee per share.
+        sell_fee - The regulatory fee on sales as a fraction of the
+            trade value.
+        tiers - A list of (threshold, per_share) tuples in increasing
+            threshold order, where each rate applies from its threshold
+            up to the next one. Overrides per_share.
+        tier_on - Whether the tiers apply to the 'monthly_volume'
+            traded before the fill or the fill 'quantity'.
+        """
+        self.per_share = per_share
+        self.per_value = per_value
+        self.minimum = minimum
+        self.max_pct = max_pct
+        self.exchange_fee = exchange_fee
+        self.sell_fee = sell_fee
+        self.tier_on = tier_on
+
+        self.tier_thresholds = None
+        self.tier_rates = None
+        if tiers:
+            self.tier_thresholds = np.array([t[0] for t in tiers], dtype=float)
+            self.tier_rates = np.array([t[1] for t in tiers], dtype=float)
+
+    def calculate(self, quantity, price, direction_sign=1, monthly_volume=0):
+        """
+        Calculates the commission and fees, in USD, of one or more
+        fills. Any of the arguments may be scalars or arrays of the
+        same length.
+
+        Parameters:
+        quantity - The filled quantity.
+        price - The fill price per unit.
+        direction_sign - 1 for a buy or -1 for a sale.
+        monthly_volume - The shares traded earlier in the month,
+            only used for monthly volume tiers.
+        """
+        scalar = np.ndim(quantity) == 0 and np.ndim(price) == 0
+        quantity = np.abs(np.asarray(quantity, dtype=float))
+        value = quantity * np.asarray(price, dtype=float)
+
+        rate = self.per_share
+        if self.tier_rates is not None:
+            basis = quantity if self.tier_on == "quantity" \
+                else np.asarray(monthly_volume, dtype=float)
+            idx = np.searchsorted(self.tier_thresholds, basis, side="right") - 1
+            rate = self.tier_rates[np.clip(idx, 0, None)]
+
+        commission = np.maximum(
+            rate * quantity + self.per_value * value, self.minimum
+        )
+        if self.max_pct is not None:
+            commission = np.minimum(commission, self.max_pct * value)
+        commission = commission + self.exchange_fee * quantity
+        if self.sell_fee:
+            commission = commission + np.where(
+                np.asarray(direction_sign) < 0, self.sell_fee * value, 0.0
+            )
+        # No trade, no commission
+        commission = np.where(quantity > 0, commission, 0.0)
+
+        if scalar and np.ndim(commission) == 0:
+            return float(commission)
+        return commission
+
+
+def monthly_volume_before(timeindex, quantity):
+    """
+    Calculates the volume traded earlier in the same calendar month
+    before each of a series of fills, for use with monthly volume
+    tiers when pricing an array of fills at once.
+
+    Parameters:
+    timeindex - The datetimes of the fills, in time order.
+    quantity - The filled quantities.
+    """
+    quantity = pd.Series(np.abs(np.asarray(quantity, dtype=float)))
+    months = pd.DatetimeIndex(timeindex).to_period("M")
+    cum = quantity.groupby(np.asarray(months)).cumsum()
+    return (cum - quantity).values
+
+
+# The Interactive Brokers "US API Directed Orders" schedule
+# previously hardcoded in FillEvent.calculate_ib_commission
+IB_API_DIRECTED = CommissionModel(
+    minimum=1.3, tiers=[(0, 0.013), (501, 0.008)], tier_on="quantity"
+)
+
+# Interactive Brokers US stock schedules, with exchange and regulatory
+# fees approximated (correct at the time of writing):
+# https://www.interactivebrokers.com/en/pricing/commissions-stocks.php
+IB_FIXED = CommissionModel(per_share=0.005, minimum=1.0, max_pct=0.01)
+
+IB_TIERED = CommissionModel(
+    minimum=0.35, max_pct=0.01, exchange_fee=0.003, sell_fee=0.0000278,
+    tiers=[
+        (0, 0.0035), (300000, 0.002), (3000000, 0.0015),
+        (20000000, 0.001), (100000000, 0.0005),
+    ]
+)
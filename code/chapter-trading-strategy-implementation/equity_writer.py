@@ -0,0 +1,205 @@
+# equity_writer.py
+
+from collections import deque
+import math
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+class EquityCurveWriter(object):
+    """
+    Streams the holdings records of a portfolio to a columnar file
+    as the backtest runs, rather than keeping the whole equity curve
+    in memory and writing it out as CSV text at the end.
+
+    Records are buffered and written in fixed-size chunks, either as
+    the row groups of a Parquet file or the record batches of an
+    Arrow IPC file, so memory is bounded by the chunk size. The
+    returns, equity curve and drawdown columns are calculated online
+    as each record is added, matching those of the CSV output.
+
+    Requires the optional pyarrow package.
+    """
+
+    def __init__(self, path, chunk_size=10000, file_format=None, tail=10):
+        """
+        Initialises the writer. The file is created on the
+        first write.
+
+        Parameters:
+        path - The output file.
+        chunk_size - The number of records written at a time.
+        file_format - 'parquet' or 'ipc', inferred from the path
+            extension (.parquet, or .arrow/.feather/.ipc) if None.
+        tail - The number of most recent records kept in memory.
+        """
+        if pa is None:
+            raise ImportError("EquityCurveWriter requires pyarrow")
+        if file_format is None:
+            file_format = _infer_format(path)
+        if file_format not in ('parquet', 'ipc'):
+            raise ValueError(
+                "EquityCurveWriter writes 'parquet' or 'ipc', not %r "
+                "(the Portfolio writes CSV itself)" % (file_format,)
+            )
+        self.path = path
+        self.chunk_size = chunk_size
+        self.file_format = file_format
+
+        self.columns = None
+        self.buffer = None
+        self.writer = None
+        self.sink = None
+        self.tail_rows = deque(maxlen=tail)
+        self.rows_written = 0
+
+        # The online state of the derived columns
+        self.last_total = None
+        self.equity = math.nan
+        self.hwm = 0.0
+
+    def write(self, holdings):
+        """
+        Adds a holdings record, writing out the buffered
+        records once a full chunk has accumulated.
+
+        Parameters:
+        holdings - A holdings dictionary, as in all_holdings.
+        """
+        row = dict(holdings)
+        total = row['total']
+        if self.last_total is None:
+            row['returns'] = math.nan
+            row['equity_curve'] = math.nan
+            row['drawdown'] = math.nan
+        else:
+            row['returns'] = total / self.last_total - 1.0
+            self.equity = (1.0 + row['returns']) if math.isnan(self.equity) \
+                else self.equity * (1.0 + row['returns'])
+            self.hwm = max(self.hwm, self.equity)
+            row['equity_curve'] = self.equity
+            row['drawdown'] = self.hwm - self.equity
+        self.last_total = total
+
+        if self.columns is None:
+            self.columns = list(row.keys())
+            self.buffer = dict((c, []) for c in self.columns)
+        for c in self.columns:
+            self.buffer[c].append(row[c])
+        self.tail_rows.append(row)
+
+        if len(self.buffer['datetime']) >= self.chunk_size:
+            self.flush()
+
+    def _schema(self):
+        """
+        The schema of the output file, with a timestamp
+        index and every other column as floats.
+        """
+        return pa.schema(
+            [('datetime', pa.timestamp('us'))] + [
+                (c, pa.float64()) for c in self.columns if c != 'datetime'
+            ]
+        )
+
+    def flush(self):
+        """
+        Writes out the buffered records.
+        """
+        if not self.buffer or not self.buffer['datetime']:
+            return
+        schema = self._schema()
+        batch = pa.RecordBatch.from_pydict(
+            dict(
+                (c, pd.to_datetime(v) if c == 'datetime' else v)
+                for c, v in self.buffer.items()
+            ),
+            schema=schema
+        )
+        if self.writer is None:
+            if self.file_format == 'parquet':
+                self.writer = pq.ParquetWriter(self.path, schema)
+            else:
+                self.sink = pa.OSFile(self.path, 'wb')
+                self.writer = pa.ipc.new_file(self.sink, schema)
+        if self.file_format == 'parquet':
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+        self.rows_written += batch.num_rows
+        for c in self.columns:
+            self.buffer[c] = []
+
+    def close(self):
+        """
+        Writes out any remaining records and closes the file.
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+    def tail(self):
+        """
+        Returns the most recent records as a DataFrame.
+        """
+        curve = pd.DataFrame(list(self.tail_rows))
+        if not curve.empty:
+            curve.set_index('datetime', inplace=True)
+        return curve
+
+
+def _infer_format(path):
+    """
+    Infers the file format of an equity curve from its extension.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return 'parquet'
+    if ext in ('.arrow', '.feather', '.ipc'):
+        return 'ipc'
+    if ext == '.csv':
+        return 'csv'
+    raise ValueError("Unknown equity curve file format: %s" % path)
+
+
+def read_equity_curve(path, columns=None):
+    """
+    Reads an equity curve written as CSV, Parquet or Arrow IPC,
+    indexed on datetime. For the columnar formats only the requested
+    columns are read from disk, and Arrow IPC files are memory mapped.
+
+    Parameters:
+    path - The equity curve file.
+    columns - The columns to read, besides datetime, or None for all.
+    """
+    file_format = _infer_format(path)
+    if columns is not None:
+        columns = ['datetime'] + [c for c in columns if c != 'datetime']
+
+    if file_format == 'csv':
+        curve = pd.read_csv(path, header=0, usecols=columns, parse_dates=['datetime'])
+    else:
+        if pa is None:
+            raise ImportError("Reading %s requires pyarrow" % path)
+        if file_format == 'parquet':
+            curve = pq.read_table(path, columns=columns).to_pandas()
+        else:
+            # Selecting columns from the memory map only pages
+            # in those columns
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+                if columns is not None:
+                    table = table.select(columns)
+                curve = table.to_pandas()
+    return curve.set_index('datetime').sort_index()
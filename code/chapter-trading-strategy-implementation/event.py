@@ -51,28 +51,32 @@ class SignalEvent(Event):
 class OrderEvent(Event):
     """
     Handles the event of sending an Order to an execution system.
-    The order contains a symbol (e.g. GOOG), a type (market or limit),
-    quantity and a direction.
+    The order contains a symbol (e.g. GOOG), a type (market, limit
+    or stop), quantity and a direction.
     """
 
-    def __init__(self, symbol, order_type, quantity, direction):
+    def __init__(self, symbol, order_type, quantity, direction, price=None):
         """
         Initialises the order type, setting whether it is
-        a Market order ('MKT') or Limit order ('LMT'), has
-        a quantity (integral) and its direction ('BUY' or
-        'SELL').
+        a Market order ('MKT'), Limit order ('LMT') or Stop
+        order ('STP'), has a quantity (integral) and its
+        direction ('BUY' or 'SELL').
 
         Parameters:
         symbol - The instrument to trade.
-        order_type - 'MKT' or 'LMT' for Market or Limit.
+        order_type - 'MKT', 'LMT' or 'STP' for Market, Limit or Stop.
         quantity - Non-negative integer for quantity.
         direction - 'BUY' or 'SELL' for long or short.
+        price - The limit or stop price, required for 'LMT' and 'STP'.
         """
         self.type = 'ORDER'
         self.symbol = symbol
         self.order_type = order_type
         self.quantity = self._check_set_quantity_positive(quantity)
         self.direction = direction
+        if order_type in ('LMT', 'STP') and price is None:
+            raise ValueError("%s order event requires a price" % order_type)
+        self.price = price
 
     def _check_set_quantity_positive(self, quantity):
         """
@@ -87,8 +91,8 @@ class OrderEvent(Event):
         Outputs the values within the Order.
         """
         print(
-            "Order: Symbol=%s, Type=%s, Quantity=%s, Direction=%s" % 
-            (self.symbol, self.order_type, self.quantity, self.direction)
+            "Order: Symbol=%s, Type=%s, Quantity=%s, Direction=%s, Price=%s" %
+            (self.symbol, self.order_type, self.quantity, self.direction, self.price)
         )
 
 
@@ -117,7 +121,8 @@ class FillEvent(Event):
         exchange - The exchange where the order was filled.
         quantity - The filled quantity.
         direction - The direction of fill ('BUY' or 'SELL')
-        fill_cost - The holdings value in dollars.
+        fill_cost - The price per unit of the fill, or None if the
+            portfolio should value it at the latest bar.
         commission - An optional commission sent from IB.
         """
         self.type = 'FILL'
@@ -126,6 +131,9 @@ class FillEvent(Event):
         self.exchange = exchange
         self.quantity = quantity
         self.direction = direction
+        # The sign of the change in position, worked out once here
+        # rather than from the direction string for every update
+        self.direction_sign = 1 if direction == 'BUY' else -1
         self.fill_cost = fill_cost
 
         # Calculate commission
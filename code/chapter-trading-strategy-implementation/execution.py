@@ -1,7 +1,8 @@
 # execution.py
 
 from abc import ABCMeta, abstractmethod
-from datetime import datetime as dt
+import heapq
+import itertools
 try:
     import Queue as queue
 except ImportError:
@@ -36,39 +37,234 @@ class ExecutionHandler(object):
         """
         raise NotImplementedError("Should implement execute_order()")
 
+    def match_orders(self, event):
+        """
+        Checks any resting orders against the latest bars, placing
+        Fill events onto the Events queue for those that trade. It
+        is called on each MarketEvent, before the strategy sees the
+        new bars.
+
+        Handlers that fill every order as it arrives have no
+        resting orders, so by default there is nothing to do.
+
+        Parameters:
+        event - A MarketEvent object.
+        """
+        pass
+
 
 class SimulatedExecutionHandler(ExecutionHandler):
     """
-    The simulated execution handler simply converts all order
-    objects into their equivalent fill objects automatically
-    without latency, slippage or fill-ratio issues.
+    The simulated execution handler converts market orders into
+    their equivalent fill objects automatically without latency,
+    slippage or fill-ratio issues.
+
+    Limit ('LMT') and stop ('STP') orders rest until a later bar
+    trades through their price. The resting orders of each symbol
+    are kept in four price-sorted heaps (buy limits, sell limits,
+    buy stops and sell stops), so each bar only has to compare its
+    high and low against the top of each heap, rather than scanning
+    every order. Triggered orders are filled in full at their price,
+    or at the bar open if the bar gapped through it.
+
+    Every fill carries its price per unit, read once from the bar
+    here, so the portfolio never has to look it up. Market orders
+    fill at the price_type value of the latest bar or, to avoid
+    trading on a close the strategy has only just seen, at the open
+    of the following bar.
 
     This allows a straightforward "first go" test of any strategy,
     before implementation with a more sophisticated execution
     handler.
     """
-    
-    def __init__(self, events):
+
+    def __init__(
+        self, bars, events, price_type="adj_close", fill_on_next_open=False,
+        commission_model=None
+    ):
         """
         Initialises the handler, setting the event queues
         up internally.
 
         Parameters:
+        bars - The DataHandler object with current market data.
         events - The Queue of Event objects.
+        price_type - The bar value market orders are filled at,
+            which should match the one the portfolio marks to.
+        fill_on_next_open - Whether to fill market orders at the
+            open of the following bar instead.
+        commission_model - An optional CommissionModel pricing the
+            commission of each fill. By default the FillEvent
+            calculates the Interactive Brokers commission.
         """
+        self.bars = bars
         self.events = events
+        self.price_type = price_type
+        self.fill_on_next_open = fill_on_next_open
+
+        # Market orders waiting for the next bar's open
+        self.next_open_orders = []
+
+        # Shares traded so far this month, for volume tiered commission
+        self.commission_model = commission_model
+        self.month = None
+        self.monthly_volume = 0
+
+        # The resting order heaps per symbol. Entries are
+        # (sort key, seq, order), where the sort key puts the
+        # order that would trigger first at the top of the heap
+        self.books = {}
+        # Ties in price are filled in the order of arrival
+        self._seq = itertools.count()
+        # Cancelled orders are dropped lazily when they reach
+        # the top of their heap. The set holds the orders themselves
+        # rather than their ids, which would not survive pickling
+        self.cancelled = set()
+
+    def _get_book(self, symbol):
+        """
+        Returns the resting order heaps for a symbol,
+        creating them if necessary.
+        """
+        if symbol not in self.books:
+            self.books[symbol] = {
+                ('LMT', 'BUY'): [], ('LMT', 'SELL'): [],
+                ('STP', 'BUY'): [], ('STP', 'SELL'): [],
+            }
+        return self.books[symbol]
+
+    def _fill(self, order, fill_cost=None):
+        """
+        Places a Fill event for an order onto the Events queue.
+        """
+        timeindex = self.bars.get_latest_bar_datetime(order.symbol)
+        commission = None
+        if self.commission_model is not None:
+            month = (timeindex.year, timeindex.month)
+            if month != self.month:
+                self.month = month
+                self.monthly_volume = 0
+            commission = self.commission_model.calculate(
+                order.quantity, fill_cost,
+                1 if order.direction == 'BUY' else -1, self.monthly_volume
+            )
+            self.monthly_volume += order.quantity
+
+        fill_event = FillEvent(
+            timeindex, order.symbol, 'ARCA', order.quantity,
+            order.direction, fill_cost, commission
+        )
+        self.events.put(fill_event)
+
+    def _get_open_price(self, symbol):
+        """
+        Returns the open of the latest bar. When filling at the
+        adjusted close, the open is adjusted by the same factor
+        so that it is comparable with the portfolio's valuations.
+        """
+        bar_open = self.bars.get_latest_bar_value(symbol, "open")
+        if self.price_type == "adj_close":
+            bar_open *= self.bars.get_latest_bar_value(symbol, "adj_close") / \
+                self.bars.get_latest_bar_value(symbol, "close")
+        return bar_open
 
     def execute_order(self, event):
         """
-        Simply converts Order objects into Fill objects naively,
-        i.e. without any latency, slippage or fill ratio problems.
+        Converts market orders into Fill objects naively, i.e.
+        without any latency, slippage or fill ratio problems. Limit
+        and stop orders are added to the resting orders, to be
+        matched against subsequent bars.
 
         Parameters:
         event - Contains an Event object with order information.
         """
         if event.type == 'ORDER':
-            fill_event = FillEvent(
-                dt.utcnow(), event.symbol,
-                'ARCA', event.quantity, event.direction, None
-            )
-            self.events.put(fill_event)
+            if event.order_type == 'MKT':
+                if self.fill_on_next_open:
+                    self.next_open_orders.append(event)
+                else:
+                    self._fill(event, self.bars.get_latest_bar_value(
+                        event.symbol, self.price_type
+                    ))
+            else:
+                # Buy limits and sell stops trigger from the highest
+                # price down, so are keyed on the negated price
+                key = event.price
+                if (event.order_type, event.direction) in (
+                    ('LMT', 'BUY'), ('STP', 'SELL')
+                ):
+                    key = -event.price
+                heap = self._get_book(event.symbol)[
+                    (event.order_type, event.direction)
+                ]
+                heapq.heappush(heap, (key, next(self._seq), event))
+
+    def cancel_order(self, event):
+        """
+        Cancels a resting limit or stop order.
+
+        Parameters:
+        event - The OrderEvent that was previously executed.
+        """
+        self.cancelled.add(event)
+
+    def open_orders(self, symbol):
+        """
+        Returns the resting orders for a symbol, in no
+        particular order.
+        """
+        return [
+            order for heap in self.books.get(symbol, {}).values()
+            for _, _, order in heap if order not in self.cancelled
+        ]
+
+    def _pop_triggered(self, heap, triggered):
+        """
+        Pops and yields the orders at the top of a heap while the
+        triggered function of their sort key is True.
+        """
+        while heap and triggered(heap[0][0]):
+            order = heapq.heappop(heap)[2]
+            if order in self.cancelled:
+                self.cancelled.discard(order)
+            else:
+                yield order
+
+    def match_orders(self, event):
+        """
+        Fills the market orders waiting for the open, then the
+        resting orders triggered by the high and low of the latest
+        bar of each symbol.
+
+        Parameters:
+        event - A MarketEvent object.
+        """
+        if event.type == 'MARKET':
+            if self.next_open_orders:
+                for order in self.next_open_orders:
+                    self._fill(order, self._get_open_price(order.symbol))
+                self.next_open_orders = []
+
+            for symbol, book in self.books.items():
+                if not any(book.values()):
+                    continue
+                bar_open = self.bars.get_latest_bar_value(symbol, "open")
+                high = self.bars.get_latest_bar_value(symbol, "high")
+                low = self.bars.get_latest_bar_value(symbol, "low")
+
+                for order in self._pop_triggered(
+                    book[('LMT', 'BUY')], lambda k: -k >= low
+                ):
+                    self._fill(order, min(order.price, bar_open))
+                for order in self._pop_triggered(
+                    book[('LMT', 'SELL')], lambda k: k <= high
+                ):
+                    self._fill(order, max(order.price, bar_open))
+                for order in self._pop_triggered(
+                    book[('STP', 'BUY')], lambda k: k <= high
+                ):
+                    self._fill(order, max(order.price, bar_open))
+                for order in self._pop_triggered(
+                    book[('STP', 'SELL')], lambda k: -k >= low
+                ):
+                    self._fill(order, min(order.price, bar_open))
@@ -1,6 +1,8 @@
 # hft_data.py
 
 from abc import ABCMeta, abstractmethod
+from collections import deque
+from itertools import islice
 import os
 
 import numpy as np
@@ -41,9 +43,18 @@ class HistoricCSVDataHandlerHFT(DataHandler):
         self.latest_symbol_data = {}
         self.continue_backtest = True       
         self.bar_index = 0
+        # The number of bars kept per symbol, or None for all
+        self.lookback = None
 
         self._open_convert_csv_files()
 
+    def _csv_source(self, symbol):
+        """
+        Returns the CSV file of a symbol, as a path or any other
+        source pandas.read_csv accepts.
+        """
+        return os.path.join(self.csv_dir, '%s.csv' % symbol)
+
     def _open_convert_csv_files(self):
         """
         Opens the CSV files from the data directory, converting
@@ -56,7 +67,7 @@ class HistoricCSVDataHandlerHFT(DataHandler):
         for sym in self.symbol_list:
             # Load the CSV file with no header information, indexed on date
             self.symbol_data[sym] = pd.read_csv(
-                os.path.join(self.csv_dir, '%s.csv' % sym),
+                self._csv_source(sym),
                 header=0, index_col=0, parse_dates=True,
                 names=[
                     'datetime', 'volume', 'vw_av_price', 'open', 'close', 
@@ -77,14 +88,71 @@ class HistoricCSVDataHandlerHFT(DataHandler):
                 index=comb_index
             )
             self.symbol_data[sym]["returns"] = self.symbol_data[sym]["close"].pct_change()
-            self.symbol_data[sym] = self.symbol_data[sym].iterrows()
 
     def _get_new_bar(self, symbol):
         """
-        Returns the latest bar from the data feed.
+        Returns the bar at the current position of the data feed,
+        as a (datetime, bar) tuple in the same form as iterrows.
+        Raises StopIteration once the data is exhausted.
+
+        The position is a plain integer, rather than an iterator
+        over the rows, so that the handler can be checkpointed.
+        """
+        data = self.symbol_data[symbol]
+        if self.bar_index >= len(data):
+            raise StopIteration
+        return data.index[self.bar_index], data.iloc[self.bar_index]
+
+    def __getstate__(self):
+        """
+        Leaves the symbol data, and the bars already seen (which
+        are a copy of its first bar_index rows), out of a pickled
+        checkpoint of the handler.
+        """
+        state = self.__dict__.copy()
+        state['symbol_data'] = {}
+        state['latest_symbol_data'] = {}
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled handler, reloading the symbol data from
+        the CSV files and rebuilding the bars seen so far.
         """
-        for b in self.symbol_data[symbol]:
-            yield b
+        self.__dict__.update(state)
+        self._open_convert_csv_files()
+        for s in self.symbol_list:
+            data = self.symbol_data[s]
+            end = min(self.bar_index, len(data))
+            start = 0 if self.lookback is None else max(0, end - self.lookback)
+            bars = [(data.index[i], data.iloc[i]) for i in range(start, end)]
+            self.latest_symbol_data[s] = bars if self.lookback is None \
+                else deque(bars, maxlen=self.lookback)
+
+    def set_lookback(self, lookback):
+        """
+        Bounds the bars kept per symbol to the most recent lookback
+        bars, in a ring buffer, rather than every bar so far. Memory
+        then stays constant however long the backtest.
+
+        Parameters:
+        lookback - The greatest number of bars any consumer asks
+            for at a time, or None to keep every bar.
+        """
+        if self.lookback is not None and self.bar_index > self.lookback and \
+                (lookback is None or lookback > self.lookback):
+            raise ValueError(
+                "Cannot extend the lookback to %s once bars have been "
+                "discarded at a lookback of %s" % (lookback, self.lookback)
+            )
+        self.lookback = lookback
+        for s in self.symbol_list:
+            if lookback is None:
+                self.latest_symbol_data[s] = list(self.latest_symbol_data[s])
+            else:
+                self.latest_symbol_data[s] = deque(
+                    self.latest_symbol_data[s], maxlen=lookback
+                )
 
     def get_latest_bar(self, symbol):
         """
@@ -109,7 +177,9 @@ class HistoricCSVDataHandlerHFT(DataHandler):
             print("That symbol is not available in the historical data set.")
             raise
         else:
-            return bars_list[-N:]
+            if self.lookback is None:
+                return bars_list[-N:]
+            return list(islice(bars_list, max(0, len(bars_list) - N), None))
 
     def get_latest_bar_datetime(self, symbol):
         """
@@ -156,10 +226,12 @@ class HistoricCSVDataHandlerHFT(DataHandler):
         """
         for s in self.symbol_list:
             try:
-                bar = next(self._get_new_bar(s))
+                bar = self._get_new_bar(s)
             except StopIteration:
                 self.continue_backtest = False
             else:
                 if bar is not None:
                     self.latest_symbol_data[s].append(bar)
+        if self.continue_backtest:
+            self.bar_index += 1
         self.events.put(MarketEvent())
@@ -5,7 +5,7 @@ import queue
 import pandas as pd
 
 from event import FillEvent, OrderEvent
-from performance import create_sharpe_ratio, create_drawdowns
+from performance import create_drawdowns, OnlinePerformance
 
 
 class PortfolioHFT(object):
@@ -27,7 +27,10 @@ class PortfolioHFT(object):
     portfolio total across bars.
     """
 
-    def __init__(self, bars, events, start_date, initial_capital=100000.0):
+    def __init__(
+        self, bars, events, start_date, initial_capital=100000.0, record='bar',
+        equity_writer=None, equity_csv='equity.csv'
+    ):
         """
         Initialises the portfolio with bars and an event queue. 
         Also includes a starting datetime index and initial capital 
@@ -38,6 +41,14 @@ class PortfolioHFT(object):
         events - The Event Queue object.
         start_date - The start date (bar) of the portfolio.
         initial_capital - The starting capital in USD.
+        record - When to record a holdings snapshot: every 'bar', an
+            integer N for every N bars, at the end of each 'session'
+            (day) or on a 'change' of positions only. The summary
+            statistics are calculated per bar regardless.
+        equity_writer - An optional EquityCurveWriter to stream the
+            holdings records to, in place of the all_holdings list.
+        equity_csv - The file the equity curve is written to
+            otherwise.
         """
         self.bars = bars
         self.events = events
@@ -47,10 +58,37 @@ class PortfolioHFT(object):
         
         self.all_positions = self.construct_all_positions()
         self.current_positions = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
+        # The symbols with a nonzero position, as an insertion
+        # ordered dict so that revaluation is deterministic
+        self.open_positions = {}
 
         self.all_holdings = self.construct_all_holdings()
         self.current_holdings = self.construct_current_holdings()
 
+        if record not in ('bar', 'session', 'change') and not (
+            isinstance(record, int) and not isinstance(record, bool)
+            and record > 0
+        ):
+            raise ValueError(
+                "record must be 'bar', 'session', 'change' or a "
+                "positive integer, not %r" % (record,)
+            )
+        self.record = record
+        self.bar_count = 0
+        # The latest snapshot not (yet) recorded, if any, and
+        # the open positions as of the last recorded snapshot
+        self.pending_snapshot = None
+        self.recorded_positions = {}
+        # The snapshot of the latest bar, recorded or not
+        self.last_snapshot = None
+        self.performance = OnlinePerformance(self.initial_capital)
+
+        # When streaming, only the initial records are kept in memory
+        self.equity_writer = equity_writer
+        self.equity_csv = equity_csv
+        if self.equity_writer is not None:
+            self.equity_writer.write(self.all_holdings[0])
+
     def construct_all_positions(self):
         """
         Constructs the positions list using the start_date
@@ -89,38 +127,91 @@ class PortfolioHFT(object):
         market data bar. This reflects the PREVIOUS bar, i.e. all
         current market data at this stage is known (OHLCV).
 
+        The portfolio statistics are updated on every bar, but the
+        record is only appended according to the recording policy.
+
         Makes use of a MarketEvent from the events queue.
         """
         latest_datetime = self.bars.get_latest_bar_datetime(self.symbol_list[0])
+        snapshot = self.take_snapshot(latest_datetime)
+        self.performance.update(snapshot[-1])
+        self.bar_count += 1
+        self.last_snapshot = snapshot
+
+        if self.record == 'bar':
+            self.record_snapshot(snapshot)
+        elif self.record == 'session':
+            # The pending snapshot was the last bar of its session
+            # if this bar falls on a different day
+            if self.pending_snapshot is not None and \
+                    self.pending_snapshot[0].date() != latest_datetime.date():
+                self.record_snapshot(self.pending_snapshot)
+            self.pending_snapshot = snapshot
+        elif self.record == 'change':
+            if snapshot[1] != self.recorded_positions:
+                self.record_snapshot(snapshot)
+            else:
+                self.pending_snapshot = snapshot
+        elif self.bar_count % self.record == 0:
+            self.record_snapshot(snapshot)
+        else:
+            self.pending_snapshot = snapshot
+
+    def take_snapshot(self, latest_datetime):
+        """
+        Returns the state of the portfolio at the latest bar, as a
+        (datetime, open positions, market values, cash, commission,
+        total) tuple. Only the open positions need revaluing, as
+        every other symbol has a market value of zero.
+        """
+        positions = {}
+        market_values = {}
+        total = self.current_holdings['cash']
+        for s in self.open_positions:
+            # Approximation to the real value
+            market_value = self.current_positions[s] * \
+                self.bars.get_latest_bar_value(s, "close")
+            positions[s] = self.current_positions[s]
+            market_values[s] = market_value
+            total += market_value
+        return (
+            latest_datetime, positions, market_values,
+            self.current_holdings['cash'],
+            self.current_holdings['commission'], total
+        )
+
+    def record_snapshot(self, snapshot):
+        """
+        Appends a snapshot to the positions and holdings lists.
+        """
+        latest_datetime, positions, market_values, cash, commission, total = snapshot
+        self.recorded_positions = positions
+        self.pending_snapshot = None
 
         # Update positions
         # ================
-        dp = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
-        dp['datetime'] = latest_datetime
+        if self.equity_writer is None:
+            dp = dict.fromkeys(self.symbol_list, 0)
+            dp.update(positions)
+            dp['datetime'] = latest_datetime
 
-        for s in self.symbol_list:
-            dp[s] = self.current_positions[s]
-
-        # Append the current positions
-        self.all_positions.append(dp)
+            # Append the current positions
+            self.all_positions.append(dp)
 
         # Update holdings
         # ===============
-        dh = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
+        dh = dict.fromkeys(self.symbol_list, 0.0)
         dh['datetime'] = latest_datetime
-        dh['cash'] = self.current_holdings['cash']
-        dh['commission'] = self.current_holdings['commission']
-        dh['total'] = self.current_holdings['cash']
-
-        for s in self.symbol_list:
-            # Approximation to the real value
-            market_value = self.current_positions[s] * \
-                self.bars.get_latest_bar_value(s, "close")
-            dh[s] = market_value
-            dh['total'] += market_value
+        dh['cash'] = cash
+        dh['commission'] = commission
+        dh['total'] = total
+        dh.update(market_values)
 
         # Append the current holdings
-        self.all_holdings.append(dh)
+        if self.equity_writer is not None:
+            self.equity_writer.write(dh)
+        else:
+            self.all_holdings.append(dh)
 
     # ======================
     # FILL/POSITION HANDLING
@@ -134,15 +225,14 @@ class PortfolioHFT(object):
         Parameters:
         fill - The Fill object to update the positions with.
         """
-        # Check whether the fill is a buy or sell
-        fill_dir = 0
-        if fill.direction == 'BUY':
-            fill_dir = 1
-        if fill.direction == 'SELL':
-            fill_dir = -1
-
         # Update positions list with new quantities
-        self.current_positions[fill.symbol] += fill_dir*fill.quantity
+        quantity = self.current_positions[fill.symbol] + \
+            fill.direction_sign * fill.quantity
+        self.current_positions[fill.symbol] = quantity
+        if quantity != 0:
+            self.open_positions[fill.symbol] = True
+        else:
+            self.open_positions.pop(fill.symbol, None)
 
     def update_holdings_from_fill(self, fill):
         """
@@ -152,18 +242,15 @@ class PortfolioHFT(object):
         Parameters:
         fill - The Fill object to update the holdings with.
         """
-        # Check whether the fill is a buy or sell
-        fill_dir = 0
-        if fill.direction == 'BUY':
-            fill_dir = 1
-        if fill.direction == 'SELL':
-            fill_dir = -1
-
-        # Update holdings list with new quantities
-        fill_cost = self.bars.get_latest_bar_value(
-            fill.symbol, "close"
-        )
-        cost = fill_dir * fill_cost * fill.quantity
+        # Update holdings list with new quantities. Fills are priced
+        # by the execution handler, but a brokerage that omits the
+        # price is valued at the latest bar
+        fill_cost = fill.fill_cost
+        if fill_cost is None:
+            fill_cost = self.bars.get_latest_bar_value(
+                fill.symbol, "close"
+            )
+        cost = fill.direction_sign * fill_cost * fill.quantity
         self.current_holdings[fill.symbol] += cost
         self.current_holdings['commission'] += fill.commission
         self.current_holdings['cash'] -= (cost + fill.commission)
@@ -224,8 +311,19 @@ class PortfolioHFT(object):
     def create_equity_curve_dataframe(self):
         """
         Creates a pandas DataFrame from the all_holdings
-        list of dictionaries.
+        list of dictionaries, first recording the final bar
+        if the recording policy skipped it.
         """
+        if self.pending_snapshot is not None:
+            self.record_snapshot(self.pending_snapshot)
+
+        # A streamed equity curve is already on disk, so only the
+        # most recent records are kept for display
+        if self.equity_writer is not None:
+            self.equity_writer.close()
+            self.equity_curve = self.equity_writer.tail()
+            return
+
         curve = pd.DataFrame(self.all_holdings)
         curve.set_index('datetime', inplace=True)
         curve['returns'] = curve['total'].pct_change()
@@ -236,18 +334,22 @@ class PortfolioHFT(object):
         """
         Creates a list of summary statistics for the portfolio.
         """
-        total_return = self.equity_curve['equity_curve'].iloc[-1]
-        returns = self.equity_curve['returns']
-        pnl = self.equity_curve['equity_curve']
-
-        sharpe_ratio = create_sharpe_ratio(returns, periods=252*6.5*60)
-        drawdown, max_dd, dd_duration = create_drawdowns(pnl)
-        self.equity_curve['drawdown'] = drawdown
+        # The statistics are per bar, whatever the resolution
+        # of the recorded equity curve
+        total_return = self.performance.equity
+        sharpe_ratio = self.performance.sharpe_ratio(periods=252*6.5*60)
+        max_dd = self.performance.max_drawdown
+        dd_duration = self.performance.max_duration
 
         stats = [("Total Return", "%0.2f%%" % ((total_return - 1.0) * 100.0)),
                  ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
                  ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
                  ("Drawdown Duration", "%d" % dd_duration)]
 
-        self.equity_curve.to_csv('equity.csv')
+        # The streamed equity curve already has its drawdowns
+        if self.equity_writer is None:
+            pnl = self.equity_curve['equity_curve']
+            drawdown, _, _ = create_drawdowns(pnl)
+            self.equity_curve['drawdown'] = drawdown
+            self.equity_curve.to_csv(self.equity_csv)
         return stats
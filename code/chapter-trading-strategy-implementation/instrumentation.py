@@ -0,0 +1,183 @@
+# instrumentation.py
+
+import cProfile
+import json
+import time
+
+
+# The handler methods timed on each component
+DATA_METHODS = ('update_bars',)
+STRATEGY_METHODS = ('calculate_signals',)
+PORTFOLIO_METHODS = ('update_timeindex', 'update_signal', 'update_fill')
+EXECUTION_METHODS = ('match_orders', 'execute_order')
+
+
+class _TimedMethod(object):
+    """
+    Wraps a bound method, accumulating its call count and wall
+    and CPU time in the instrumentation, keyed by the name of the
+    handler and the type of event it was called with.
+    """
+
+    def __init__(self, instrumentation, name, method):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.method = method
+
+    def __call__(self, *args, **kwargs):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            return self.method(*args, **kwargs)
+        finally:
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+            event_type = getattr(args[0], 'type', '-') if args else '-'
+            timing = self.instrumentation.timings.setdefault(
+                (self.name, event_type), [0, 0.0, 0.0]
+            )
+            timing[0] += 1
+            timing[1] += wall
+            timing[2] += cpu
+
+
+class Instrumentation(object):
+    """
+    Times the handlers of a Backtest, to show where the time of
+    a slow run goes. The call count and wall and CPU time of each
+    handler method are accumulated per event type, along with the
+    time of the loop as a whole, from which the time spent in the
+    loop itself (passing events on, checkpointing and so on) follows.
+
+    The methods are wrapped on the component instances when the
+    instrumentation is attached, so a backtest without it runs
+    exactly as before. A cProfile capture of the run can also be
+    taken, for a breakdown by function.
+    """
+
+    def __init__(self, json_path=None, profile_path=None):
+        """
+        Initialises the instrumentation.
+
+        Parameters:
+        json_path - An optional file to export the timings to
+            as JSON at the end of the run.
+        profile_path - An optional file to write a cProfile
+            capture of the run to, readable with pstats.
+        """
+        self.json_path = json_path
+        self.profile_path = profile_path
+        self.profiler = None
+
+        # (handler, event type) -> [calls, wall time, CPU time]
+        self.timings = {}
+        self.loop_wall = 0.0
+        self.loop_cpu = 0.0
+
+    def _wrap(self, component, methods, prefix):
+        """
+        Replaces the named methods of a component with timed ones.
+        """
+        for method in methods:
+            if hasattr(component, method):
+                setattr(component, method, _TimedMethod(
+                    self, "%s.%s" % (prefix, method), getattr(component, method)
+                ))
+
+    def attach(self, backtest):
+        """
+        Wraps the handler methods of the data handler and of
+        the strategy, portfolio and execution handler of every
+        strategy in the backtest.
+
+        Parameters:
+        backtest - The Backtest to instrument.
+        """
+        self._wrap(backtest.data_handler, DATA_METHODS, 'DataHandler')
+        for sandbox in backtest.sandboxes:
+            prefix = "%s: " % sandbox.name if backtest.num_strats > 1 else ""
+            self._wrap(sandbox.strategy, STRATEGY_METHODS, prefix + 'Strategy')
+            self._wrap(sandbox.portfolio, PORTFOLIO_METHODS, prefix + 'Portfolio')
+            self._wrap(
+                sandbox.execution_handler, EXECUTION_METHODS,
+                prefix + 'ExecutionHandler'
+            )
+
+    def start(self):
+        """
+        Starts timing the backtest loop.
+        """
+        if self.profile_path is not None:
+            if self.profiler is None:
+                self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.started = (time.perf_counter(), time.process_time())
+
+    def stop(self):
+        """
+        Stops timing the backtest loop.
+        """
+        wall, cpu = self.started
+        self.loop_wall += time.perf_counter() - wall
+        self.loop_cpu += time.process_time() - cpu
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def breakdown(self):
+        """
+        Returns the timings as a list of dictionaries, slowest
+        first, ending with the time spent in the loop itself.
+        """
+        rows = [
+            {
+                'handler': name, 'event': event_type, 'calls': calls,
+                'wall': wall, 'cpu': cpu,
+                'per_call_us': 1e6 * wall / calls if calls else 0.0,
+            }
+            for (name, event_type), (calls, wall, cpu) in self.timings.items()
+        ]
+        rows.sort(key=lambda row: row['wall'], reverse=True)
+        rows.append({
+            'handler': 'Backtest loop', 'event': '-', 'calls': 1,
+            'wall': self.loop_wall - sum(row['wall'] for row in rows),
+            'cpu': self.loop_cpu - sum(row['cpu'] for row in rows),
+            'per_call_us': 0.0,
+        })
+        return rows
+
+    def output(self):
+        """
+        Prints the breakdown table, and writes out the JSON
+        export and cProfile capture if requested.
+        """
+        rows = self.breakdown()
+        print("Timings (total %0.3fs wall, %0.3fs CPU):" % (
+            self.loop_wall, self.loop_cpu
+        ))
+        print("%-50s %-8s %10s %10s %10s %7s %12s" % (
+            "Handler", "Event", "Calls", "Wall (s)", "CPU (s)", "Wall %", "us/call"
+        ))
+        for row in rows:
+            print("%-50s %-8s %10d %10.3f %10.3f %6.1f%% %12.1f" % (
+                row['handler'], row['event'], row['calls'], row['wall'],
+                row['cpu'],
+                100.0 * row['wall'] / self.loop_wall if self.loop_wall else 0.0,
+                row['per_call_us']
+            ))
+
+        if self.json_path is not None:
+            with open(self.json_path, 'w') as f:
+                json.dump({
+                    'loop_wall': self.loop_wall, 'loop_cpu': self.loop_cpu,
+                    'handlers': rows
+                }, f, indent=2)
+        if self.profiler is not None:
+            self.profiler.dump_stats(self.profile_path)
+
+    def __getstate__(self):
+        """
+        Leaves the profiler out when the backtest is checkpointed.
+        """
+        state = self.__dict__.copy()
+        state['profiler'] = None
+        return state
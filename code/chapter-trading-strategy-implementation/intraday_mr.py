@@ -10,6 +10,7 @@ from backtest import Backtest
 from hft_data import HistoricCSVDataHandlerHFT
 from hft_portfolio import PortfolioHFT
 from execution import SimulatedExecutionHandler
+from telemetry import configure_telemetry
 
 
 class IntradayOLSMRStrategy(Strategy):
@@ -42,11 +43,14 @@ class IntradayOLSMRStrategy(Strategy):
         self.zscore_high = zscore_high
 
         self.pair = tuple(self.symbol_list)
-        self.datetime = dt.utcnow()
 
         self.long_market = False
         self.short_market = False
 
+    @property
+    def max_lookback(self):
+        return self.ols_window
+
     def calculate_xy_signals(self, zscore_last):
         """
         Calculates the actual x, y signal pairings
@@ -59,7 +63,7 @@ class IntradayOLSMRStrategy(Strategy):
         x_signal = None
         p0 = self.pair[0]
         p1 = self.pair[1]
-        cur_dt = self.datetime
+        cur_dt = self.bars.get_latest_bar_datetime(p0)
         hr = abs(self.hedge_ratio)
 
         # If we're long the market and below the 
@@ -144,6 +148,8 @@ if __name__ == "__main__":
     backtest = Backtest(
         csv_dir, symbol_list, initial_capital, heartbeat, 
         start_date, HistoricCSVDataHandlerHFT, SimulatedExecutionHandler, 
-        PortfolioHFT, IntradayOLSMRStrategy
+        PortfolioHFT, IntradayOLSMRStrategy,
+        execution_params={'price_type': 'close'}
     )
+    configure_telemetry(trade_log='trades.log')
     backtest.simulate_trading()
@@ -0,0 +1,311 @@
+# journal.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from performance import create_sharpe_ratio
+
+
+# Record kinds
+SIGNAL, ORDER, FILL, BAR, MARK = 1, 2, 3, 4, 5
+
+SIGNAL_DIRECTIONS = {'LONG': 1, 'SHORT': -1, 'EXIT': 0}
+ORDER_TYPES = {'MKT': 0, 'LMT': 1, 'STP': 2}
+
+# A fixed-size binary record per event. BAR records mark the end
+# of each bar for a strategy, carrying its cash, and are followed
+# by a MARK record valuing each of its open positions.
+JOURNAL_DTYPE = np.dtype([
+    ('tick', '<i8'),
+    ('datetime', '<M8[us]'),
+    ('kind', 'u1'),
+    ('strategy', '<u2'),
+    ('symbol', '<i4'),
+    ('direction', 'i1'),
+    ('order_type', 'u1'),
+    ('quantity', '<f8'),
+    ('price', '<f8'),
+    ('commission', '<f8'),
+])
+
+
+class EventJournal(object):
+    """
+    Records every Signal, Order and Fill event of a Backtest, along
+    with the per-bar valuations of each portfolio, to an append-only
+    file of fixed-size binary records. Records are buffered and
+    written in chunks, and a JSON header alongside the journal holds
+    the symbols, strategies and initial capital.
+
+    The journal of a run is deterministic, so two journals can be
+    compared to find where runs diverge, and replay_journal can
+    rebuild the equity curve from it without rerunning the data
+    handling or strategies.
+    """
+
+    def __init__(self, path, chunk_size=65536):
+        """
+        Initialises the journal. It is started by the Backtest.
+
+        Parameters:
+        path - The journal file. The header is written to
+            path + '.json'.
+        chunk_size - The number of records written at a time.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.file = None
+
+    def start(self, backtest):
+        """
+        Writes the header and opens a new journal file.
+
+        Parameters:
+        backtest - The Backtest being journalled.
+        """
+        self.clock = backtest.clock
+        self.symbols = dict((s, i) for i, s in enumerate(backtest.symbol_list))
+        with open(self.path + '.json', 'w') as f:
+            json.dump({
+                'symbols': list(backtest.symbol_list),
+                'strategies': [sb.name for sb in backtest.sandboxes],
+                'initial_capital': backtest.initial_capital,
+                'start_date': str(pd.Timestamp(backtest.start_date)),
+            }, f)
+        self.file = open(self.path, 'wb')
+
+    def _append(self, strategy, kind, symbol=-1, direction=0, order_type=0,
+                quantity=0.0, price=np.nan, commission=0.0):
+        """
+        Buffers a record, writing out the buffer once full.
+        """
+        self.buffer.append((
+            self.clock.tick, self.clock.datetime, kind, strategy,
+            self.symbols.get(symbol, -1), direction, order_type,
+            quantity, price, commission
+        ))
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def record(self, strategy, event):
+        """
+        Records a Signal, Order or Fill event.
+
+        Parameters:
+        strategy - The index of the strategy the event belongs to.
+        event - The Event object.
+        """
+        if event.type == 'SIGNAL':
+            self._append(
+                strategy, SIGNAL, event.symbol,
+                SIGNAL_DIRECTIONS.get(event.signal_type, 0),
+                quantity=event.strength
+            )
+        elif event.type == 'ORDER':
+            self._append(
+                strategy, ORDER, event.symbol,
+                1 if event.direction == 'BUY' else -1,
+                ORDER_TYPES.get(event.order_type, 0), event.quantity,
+                np.nan if event.price is None else event.price
+            )
+        elif event.type == 'FILL':
+            self._append(
+                strategy, FILL, event.symbol, event.direction_sign,
+                quantity=event.quantity,
+                price=np.nan if event.fill_cost is None else event.fill_cost,
+                commission=event.commission
+            )
+
+    def record_bar(self, strategy, snapshot):
+        """
+        Records the valuation of a portfolio at the end of a bar.
+
+        Parameters:
+        strategy - The index of the strategy.
+        snapshot - The portfolio snapshot, as from take_snapshot.
+        """
+        _, positions, market_values, cash, commission, total = snapshot
+        self._append(strategy, BAR, price=cash, commission=commission)
+        for s, quantity in positions.items():
+            self._append(
+                strategy, MARK, s, quantity=quantity,
+                price=market_values[s] / quantity
+            )
+
+    def flush(self):
+        """
+        Writes out the buffered records.
+        """
+        if self.buffer and self.file is not None:
+            np.array(self.buffer, dtype=JOURNAL_DTYPE).tofile(self.file)
+            self.file.flush()
+        self.buffer = []
+
+    def close(self):
+        """
+        Writes out any remaining records and closes the journal.
+        """
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __getstate__(self):
+        """
+        Flushes the journal when the backtest is checkpointed,
+        noting its length so that it can be resumed.
+        """
+        if self.file is not None:
+            self.flush()
+        state = self.__dict__.copy()
+        state['file'] = None
+        state['is_open'] = self.file is not None
+        state['size'] = os.path.getsize(self.path) \
+            if os.path.exists(self.path) else 0
+        return state
+
+    def __setstate__(self, state):
+        """
+        Reopens the journal of a resumed backtest, discarding any
+        records written after the checkpoint. A journal which
+        was already closed is left as it is.
+        """
+        size = state.pop('size')
+        is_open = state.pop('is_open')
+        self.__dict__.update(state)
+        if is_open:
+            self.file = open(self.path, 'r+b')
+            self.file.truncate(size)
+            self.file.seek(size)
+
+
+def read_journal(path):
+    """
+    Memory maps a journal, returning its records and header.
+
+    Parameters:
+    path - The journal file.
+    """
+    with open(path + '.json') as f:
+        header = json.load(f)
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=JOURNAL_DTYPE), header
+    return np.memmap(path, dtype=JOURNAL_DTYPE, mode='r'), header
+
+
+def first_difference(path_a, path_b):
+    """
+    Returns the position of the first record at which two
+    journals differ, or None if they are identical.
+
+    Parameters:
+    path_a - The first journal file.
+    path_b - The second journal file.
+    """
+    a, _ = read_journal(path_a)
+    b, _ = read_journal(path_b)
+    n = min(len(a), len(b))
+    # Compare the raw bytes, as NaN prices never compare equal
+    size = JOURNAL_DTYPE.itemsize
+    a_bytes = np.asarray(a[:n]).view(np.uint8).reshape(n, size)
+    b_bytes = np.asarray(b[:n]).view(np.uint8).reshape(n, size)
+    diff = np.flatnonzero((a_bytes != b_bytes).any(axis=1))
+    if len(diff) > 0:
+        return int(diff[0])
+    return None if len(a) == len(b) else n
+
+
+def replay_journal(path, strategy=0, commission_model=None, periods=252):
+    """
+    Rebuilds the equity curve and summary statistics of a strategy
+    from its journal, without any data handling or strategy logic.
+    The cash of each bar is the initial capital less the cumulative
+    cost of the fills before it, and its total adds the positions
+    valued by the MARK records, all calculated with vectorised numpy
+    operations over the whole journal.
+
+    Optionally the fills can be recosted under a different
+    commission model, keeping their prices and quantities.
+
+    Parameters:
+    path - The journal file.
+    strategy - The index of the strategy to replay.
+    commission_model - An optional CommissionModel to recost
+        the fills with.
+    periods - The number of bars per year, for the Sharpe ratio.
+
+    Returns:
+    curve - The equity curve DataFrame, as from the Portfolio.
+    stats - The summary statistics, as from the Portfolio.
+    """
+    records, header = read_journal(path)
+    records = records[records['strategy'] == strategy]
+    initial_capital = header['initial_capital']
+
+    kind = records['kind']
+    fills = kind == FILL
+    quantity = records['quantity']
+    price = records['price']
+    sign = records['direction'].astype(np.float64)
+
+    commission = np.where(fills, records['commission'], 0.0)
+    if commission_model is not None:
+        from commission import monthly_volume_before
+        fill_idx = np.flatnonzero(fills)
+        commission[fill_idx] = commission_model.calculate(
+            quantity[fill_idx], price[fill_idx], sign[fill_idx],
+            monthly_volume_before(
+                records['datetime'][fill_idx], quantity[fill_idx]
+            )
+        )
+
+    # The cash and commission paid up to each record
+    cost = np.where(fills, sign * quantity * price, 0.0)
+    cash = initial_capital - np.cumsum(cost + commission)
+    total_commission = np.cumsum(commission)
+
+    # Sum the marked positions of each bar
+    bars = np.flatnonzero(kind == BAR)
+    bar_id = np.cumsum(kind == BAR) - 1
+    marks = kind == MARK
+    market_value = np.bincount(
+        bar_id[marks], weights=quantity[marks] * price[marks],
+        minlength=len(bars)
+    )
+
+    datetimes = np.concatenate([
+        np.array([pd.Timestamp(header['start_date'])], dtype='M8[us]'),
+        records['datetime'][bars]
+    ])
+    curve = pd.DataFrame({
+        'datetime': datetimes,
+        'cash': np.concatenate([[initial_capital], cash[bars]]),
+        'commission': np.concatenate([[0.0], total_commission[bars]]),
+        'total': np.concatenate([
+            [initial_capital], cash[bars] + market_value
+        ]),
+    }).set_index('datetime')
+    curve['returns'] = curve['total'].pct_change()
+    curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
+
+    # Drawdowns, as in create_drawdowns but without the loop
+    pnl = curve['equity_curve'].values
+    hwm = np.maximum.accumulate(np.nan_to_num(pnl, nan=0.0))
+    drawdown = hwm - pnl
+    idx = np.arange(len(pnl))
+    last_high = np.maximum.accumulate(np.where(drawdown == 0, idx, 0))
+    duration = idx - last_high
+    curve['drawdown'] = drawdown
+
+    total_return = pnl[-1] if len(pnl) > 1 else 1.0
+    stats = [
+        ("Total Return", "%0.2f%%" % ((total_return - 1.0) * 100.0)),
+        ("Sharpe Ratio", "%0.2f" % create_sharpe_ratio(curve['returns'], periods)),
+        ("Max Drawdown", "%0.2f%%" % (np.nanmax(drawdown) * 100.0)),
+        ("Drawdown Duration", "%d" % duration.max()),
+    ]
+    return curve, stats
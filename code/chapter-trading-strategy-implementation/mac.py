@@ -10,6 +10,7 @@ from backtest import Backtest
 from data import HistoricCSVDataHandler
 from execution import SimulatedExecutionHandler
 from portfolio import Portfolio
+from telemetry import configure_telemetry, trade_logger
 
 
 class MovingAverageCrossStrategy(Strategy):
@@ -40,6 +41,10 @@ class MovingAverageCrossStrategy(Strategy):
         # Set to True if a symbol is in the market
         self.bought = self._calculate_initial_bought()
 
+    @property
+    def max_lookback(self):
+        return max(self.short_window, self.long_window)
+
     def _calculate_initial_bought(self):
         """
         Adds keys to the bought dictionary for all symbols
@@ -70,17 +75,17 @@ class MovingAverageCrossStrategy(Strategy):
                     long_sma = np.mean(bars[-self.long_window:])
 
                     symbol = s
-                    cur_date = dt.utcnow()
+                    cur_date = bar_date
                     sig_dir = ""
 
                     if short_sma > long_sma and self.bought[s] == "OUT":
-                        print("LONG: %s" % bar_date)
+                        trade_logger.info("LONG: %s %s", s, bar_date)
                         sig_dir = 'LONG'
                         signal = SignalEvent(1, symbol, cur_date, sig_dir, 1.0)
                         self.events.put(signal)
                         self.bought[s] = 'LONG'
                     elif short_sma < long_sma and self.bought[s] == "LONG":
-                        print("SHORT: %s" % bar_date)
+                        trade_logger.info("SHORT: %s %s", s, bar_date)
                         sig_dir = 'EXIT'
                         signal = SignalEvent(1, symbol, cur_date, sig_dir, 1.0)
                         self.events.put(signal)
@@ -99,4 +104,5 @@ if __name__ == "__main__":
         start_date, HistoricCSVDataHandler, SimulatedExecutionHandler, 
         Portfolio, MovingAverageCrossStrategy
     )
+    configure_telemetry(trade_log='trades.log')
     backtest.simulate_trading()
@@ -0,0 +1,197 @@
+# memory_profiling.py
+
+import json
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+
+# Modules whose allocations are attributed to the events
+EVENT_MODULES = ('event', 'scheduler')
+
+
+def _module_file(obj):
+    """
+    The source file of the class of an object.
+    """
+    module = sys.modules.get(type(obj).__module__)
+    path = getattr(module, '__file__', None)
+    return os.path.abspath(path) if path else None
+
+
+class MemoryProfiler(object):
+    """
+    Measures the memory a Backtest holds as it runs, to size
+    production jobs before they run out of memory. The bars kept by
+    the data handler, the portfolio ledgers and the events all grow
+    with the length of a backtest.
+
+    A tracemalloc snapshot is taken every few heartbeats, and each
+    allocation still alive is attributed to the component whose code
+    made it: the innermost frame of its traceback in the module of the
+    data handler, a portfolio, a strategy, an execution handler or the
+    events. So a bar row allocated by pandas on behalf of the data
+    handler counts towards the data handler. Anything else, such as
+    imported modules, counts as 'other'.
+
+    Tracing slows a backtest down considerably, so is only done
+    when a profiler is given.
+    """
+
+    def __init__(self, every=1000, frames=30, json_path=None):
+        """
+        Initialises the profiler.
+
+        Parameters:
+        every - The number of heartbeats between snapshots.
+        frames - The number of frames of each traceback stored,
+            enough to reach the component beneath library code.
+        json_path - An optional file to export the samples to
+            as JSON at the end of the run.
+        """
+        self.every = every
+        self.frames = frames
+        self.json_path = json_path
+
+        # (heartbeats, {component: bytes}) for each snapshot
+        self.samples = []
+        self.started_tracing = False
+
+    def _components(self, backtest):
+        """
+        Maps the source file of each component to its name.
+        """
+        files = {}
+        for sandbox in backtest.sandboxes:
+            files[_module_file(sandbox.strategy)] = 'strategy'
+            files[_module_file(sandbox.portfolio)] = 'portfolio'
+            files[_module_file(sandbox.execution_handler)] = 'execution'
+        files[_module_file(backtest.data_handler)] = 'data_handler'
+        for name in EVENT_MODULES:
+            module = sys.modules.get(name)
+            if module is not None:
+                files[os.path.abspath(module.__file__)] = 'events'
+        files.pop(None, None)
+        return files
+
+    def start(self, backtest):
+        """
+        Starts tracing allocations, unless already tracing.
+
+        Parameters:
+        backtest - The Backtest to profile.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started_tracing = True
+        tracemalloc.reset_peak()
+        self.files = self._components(backtest)
+        self.filenames = {}
+
+    def _component_of(self, filename):
+        """
+        The component a source file belongs to, if any.
+        """
+        if filename not in self.filenames:
+            self.filenames[filename] = self.files.get(os.path.abspath(filename))
+        return self.filenames[filename]
+
+    def sample(self, backtest):
+        """
+        Takes a snapshot, totalling the live allocations of
+        each component.
+
+        Parameters:
+        backtest - The Backtest being profiled.
+        """
+        snapshot = tracemalloc.take_snapshot()
+        usage = dict((c, 0) for c in set(self.files.values()))
+        usage['other'] = 0
+        # Cache the component of each distinct traceback
+        cache = {}
+        for trace in snapshot.traces:
+            traceback = trace.traceback
+            component = cache.get(traceback)
+            if component is None:
+                component = 'other'
+                # Frames run from the oldest to the most recent
+                for frame in reversed(traceback):
+                    name = self._component_of(frame.filename)
+                    if name is not None:
+                        component = name
+                        break
+                cache[traceback] = component
+            usage[component] += trace.size
+        current, peak = tracemalloc.get_traced_memory()
+        usage['total'] = current
+        usage['traced_peak'] = peak
+        self.samples.append((backtest.heartbeats, usage))
+
+    def stop(self, backtest):
+        """
+        Takes a final snapshot, and stops tracing if this
+        profiler started it.
+
+        Parameters:
+        backtest - The Backtest being profiled.
+        """
+        if not self.samples or self.samples[-1][0] != backtest.heartbeats:
+            self.sample(backtest)
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def summary(self):
+        """
+        Returns the peak and final (steady-state) bytes of each
+        component across the snapshots, with its growth per 1000
+        bars, fitted over the snapshots, to extrapolate to longer
+        backtests.
+        """
+        rows = []
+        if not self.samples:
+            return rows
+        bars = np.array([hb for hb, _ in self.samples], dtype=np.float64)
+        for component in sorted(self.samples[-1][1]):
+            if component == 'traced_peak':
+                continue
+            used = np.array([u.get(component, 0) for _, u in self.samples], dtype=np.float64)
+            growth = np.polyfit(bars, used, 1)[0] * 1000.0 if len(used) > 1 else 0.0
+            rows.append({
+                'component': component, 'peak': int(used.max()),
+                'final': int(used[-1]), 'growth_per_1000_bars': growth,
+            })
+        return rows
+
+    def output(self):
+        """
+        Prints the usage of each component, and writes out the
+        JSON export if requested.
+        """
+        rows = self.summary()
+        print("Memory (%d snapshots, traced peak %0.1f MB):" % (
+            len(self.samples),
+            max(u['traced_peak'] for _, u in self.samples) / 1024.0 ** 2
+            if self.samples else 0.0
+        ))
+        print("%-14s %12s %12s %18s" % (
+            "Component", "Peak (MB)", "Final (MB)", "MB/1000 bars"
+        ))
+        for row in rows:
+            print("%-14s %12.2f %12.2f %18.3f" % (
+                row['component'], row['peak'] / 1024.0 ** 2,
+                row['final'] / 1024.0 ** 2,
+                row['growth_per_1000_bars'] / 1024.0 ** 2
+            ))
+
+        if self.json_path is not None:
+            with open(self.json_path, 'w') as f:
+                json.dump({
+                    'summary': rows,
+                    'samples': [
+                        {'heartbeats': hb, 'usage': usage}
+                        for hb, usage in self.samples
+                    ],
+                }, f, indent=2)
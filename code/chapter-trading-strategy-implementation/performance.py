@@ -44,3 +44,68 @@ def create_drawdowns(pnl):
         drawdown.iloc[t]= (hwm[t]-pnl.iloc[t])
         duration.iloc[t]= (0 if drawdown.iloc[t] == 0 else duration.iloc[t-1]+1)
     return drawdown, drawdown.max(), duration.max()
+
+
+class OnlinePerformance(object):
+    """
+    Calculates the Sharpe ratio and drawdowns of an equity curve
+    incrementally, one bar at a time, in constant memory. The results
+    match create_sharpe_ratio and create_drawdowns applied to the
+    full per-bar equity curve, so the portfolio can report per-bar
+    statistics while recording its holdings at a lower resolution.
+    """
+
+    def __init__(self, initial_capital):
+        """
+        Initialises the statistics at the initial capital.
+
+        Parameters:
+        initial_capital - The starting value of the portfolio.
+        """
+        self.initial_capital = initial_capital
+        self.last_total = initial_capital
+        self.equity = 1.0
+
+        # Running mean and sum of squared deviations of the
+        # returns, updated with Welford's algorithm
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+        self.hwm = 0.0
+        self.drawdown = 0.0
+        self.duration = 0
+        self.max_drawdown = 0.0
+        self.max_duration = 0
+
+    def update(self, total):
+        """
+        Adds the portfolio value of the latest bar.
+
+        Parameters:
+        total - The total portfolio value.
+        """
+        ret = total / self.last_total - 1.0
+        self.last_total = total
+        self.n += 1
+        delta = ret - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (ret - self.mean)
+
+        self.equity = total / self.initial_capital
+        self.hwm = max(self.hwm, self.equity)
+        self.drawdown = self.hwm - self.equity
+        self.duration = 0 if self.drawdown == 0 else self.duration + 1
+        self.max_drawdown = max(self.max_drawdown, self.drawdown)
+        self.max_duration = max(self.max_duration, self.duration)
+
+    def sharpe_ratio(self, periods=252):
+        """
+        Returns the Sharpe ratio of the per-bar returns so far.
+
+        Parameters:
+        periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+        """
+        if self.n == 0 or self.m2 == 0:
+            return np.nan
+        return np.sqrt(periods) * self.mean / np.sqrt(self.m2 / self.n)
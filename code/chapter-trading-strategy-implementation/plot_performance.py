@@ -1,14 +1,19 @@
 # plot_performance.py
 
+import sys
+
 import matplotlib.pyplot as plt
-import pandas as pd
+
+from equity_writer import read_equity_curve
 
 
 if __name__ == "__main__":
-    data = pd.read_csv(
-        "equity.csv", header=0, 
-        parse_dates=True, index_col=0
-    ).sort_values(by='datetime')
+    # The equity curve may be CSV, Parquet or Arrow IPC, of
+    # which only the plotted columns are read
+    path = sys.argv[1] if len(sys.argv) > 1 else "equity.csv"
+    data = read_equity_curve(
+        path, columns=['equity_curve', 'returns', 'drawdown']
+    )
 
     # Plot three charts: Equity curve, 
     # period returns, drawdowns
@@ -0,0 +1,108 @@
+# scheduler.py
+
+import heapq
+import itertools
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class SimulatedClock(object):
+    """
+    The SimulatedClock replaces the wall clock within a backtest.
+    Time is driven by the DataHandler, advancing one tick per
+    heartbeat and taking its datetime from the latest bar, so
+    that a run is entirely reproducible and never has to ask
+    the operating system for the time.
+    """
+
+    def __init__(self, start_date=None):
+        """
+        Initialises the clock before the first bar.
+
+        Parameters:
+        start_date - The datetime reported before the first bar.
+        """
+        self.tick = 0
+        self.datetime = start_date
+
+    def advance(self):
+        """
+        Moves the clock on to the next bar.
+        """
+        self.tick += 1
+
+    def set_datetime(self, datetime):
+        """
+        Sets the datetime of the current bar.
+
+        Parameters:
+        datetime - The timestamp of the latest bar.
+        """
+        self.datetime = datetime
+
+
+class EventScheduler(object):
+    """
+    A priority queue of events keyed on the simulated clock tick at
+    which each is due, used in place of a queue.Queue. Events become
+    available from get only once the clock reaches their tick, and
+    events due on the same tick come out in the order they were put.
+
+    Putting an event with a delay models latency without sleeping.
+    For example, delays={'FILL': 1} holds every fill back until the
+    next bar, ahead of that bar's MarketEvent. Events put with no
+    delay behave exactly as with a FIFO queue.
+    """
+
+    def __init__(self, clock, delays=None):
+        """
+        Initialises the scheduler.
+
+        Parameters:
+        clock - The SimulatedClock providing the current tick.
+        delays - An optional dictionary of the default delay,
+            in ticks, of each event type, e.g. {'FILL': 1}.
+        """
+        self.clock = clock
+        self.delays = delays or {}
+        self._heap = []
+        self._seq = itertools.count()
+
+    def put(self, event, delay=None):
+        """
+        Schedules an event.
+
+        Parameters:
+        event - The Event object.
+        delay - The number of ticks until the event is due,
+            overriding the default delay of its type.
+        """
+        if delay is None:
+            delay = self.delays.get(event.type, 0)
+        heapq.heappush(
+            self._heap, (self.clock.tick + delay, next(self._seq), event)
+        )
+
+    def get(self, block=False, timeout=None):
+        """
+        Removes and returns the next due event. Simulated time
+        cannot pass while waiting, so this never blocks, and raises
+        queue.Empty if no event is due at the current tick.
+        """
+        if self._heap and self._heap[0][0] <= self.clock.tick:
+            return heapq.heappop(self._heap)[2]
+        raise queue.Empty
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def qsize(self):
+        """
+        Returns the number of scheduled events, due or not.
+        """
+        return len(self._heap)
+
+    def empty(self):
+        return not self._heap
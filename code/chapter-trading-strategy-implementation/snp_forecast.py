@@ -12,6 +12,7 @@ from data import HistoricCSVDataHandler
 from execution import SimulatedExecutionHandler
 from portfolio import Portfolio
 from create_lagged_series import create_lagged_series
+from telemetry import configure_telemetry
 
 
 class SPYDailyForecastStrategy(Strategy):
@@ -21,11 +22,12 @@ class SPYDailyForecastStrategy(Strategy):
     period and then generated long/exit signals based on the
     prediction.
     """
+    max_lookback = 3
+
     def __init__(self, bars, events):
         self.bars = bars
         self.symbol_list = self.bars.symbol_list
         self.events = events
-        self.datetime_now = dt.utcnow()
 
         self.model_start_date = dt(2016,10,1)
         self.model_end_date = dt(2017,12,31)
@@ -65,7 +67,6 @@ class SPYDailyForecastStrategy(Strategy):
         Calculate the SignalEvents based on market data.
         """
         sym = self.symbol_list[0]
-        cur_date = self.datetime_now
 
         if event.type == 'MARKET':
             self.bar_index += 1
@@ -81,6 +82,7 @@ class SPYDailyForecastStrategy(Strategy):
                 )
                 pred_reshape = pred_series.values.reshape(1, -1)
                 pred = self.model.predict(pred_reshape)
+                cur_date = self.bars.get_latest_bar_datetime(sym)
                 if pred > 0 and not self.long_market:
                     self.long_market = True
                     signal = SignalEvent(1, sym, cur_date, 'LONG', 1.0)
@@ -104,4 +106,5 @@ if __name__ == "__main__":
         start_date, HistoricCSVDataHandler, SimulatedExecutionHandler, 
         Portfolio, SPYDailyForecastStrategy
     )
+    configure_telemetry(trade_log='trades.log')
     backtest.simulate_trading()
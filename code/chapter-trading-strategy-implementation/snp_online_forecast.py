@@ -0,0 +1,191 @@
+# snp_online_forecast.py
+
+from datetime import datetime as dt
+import time
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+from strategy import Strategy
+from event import SignalEvent
+from backtest import Backtest
+from data import HistoricCSVDataHandler
+from execution import SimulatedExecutionHandler
+from portfolio import Portfolio
+from telemetry import configure_telemetry
+
+
+class SPYOnlineForecastStrategy(Strategy):
+    """
+    An online variant of the S&P500 forecast strategy. Rather than
+    fitting a batch model once before trading, it uses an incremental
+    learner (by default a linear SGD classifier) that is updated with
+    partial_fit on every new bar, using the realised direction of that
+    bar as the label for the lagged returns seen on the previous bar.
+
+    Each update costs O(features), so intraday models can adapt
+    continuously without the cost of periodic retraining. The time
+    taken by every update is recorded so that the per-bar latency
+    can be reported.
+    """
+
+    def __init__(self, bars, events, model=None, lags=2, warmup=20):
+        """
+        Initialises the online forecast strategy.
+
+        Parameters:
+        bars - The DataHandler object that provides bar information
+        events - The Event Queue object.
+        model - An unfitted classifier supporting partial_fit.
+        lags - The number of lagged returns used as predictors.
+        warmup - The number of updates before predictions are traded.
+        """
+        self.bars = bars
+        self.symbol_list = self.bars.symbol_list
+        self.events = events
+        self.lags = lags
+        self.warmup = warmup
+
+        if model is None:
+            model = SGDClassifier(loss="log_loss", alpha=1e-4)
+        self.model = model
+        self.classes = np.array([-1.0, 1.0])
+
+        self.long_market = False
+        self.prev_features = None
+        self.n_updates = 0
+        self.update_latencies = []
+
+    @property
+    def max_lookback(self):
+        return self.lags
+
+    def _update_model(self, features, direction):
+        """
+        Updates the model with a single labelled observation,
+        recording the time taken.
+
+        Parameters
+        features - The predictors seen on the previous bar.
+        direction - The realised direction of the current bar.
+        """
+        start = time.perf_counter()
+        self.model.partial_fit(
+            features, np.array([direction]), classes=self.classes
+        )
+        self.update_latencies.append(time.perf_counter() - start)
+        self.n_updates += 1
+
+    def calculate_signals(self, event):
+        """
+        Updates the model with the realised direction of the latest
+        bar, then forecasts the direction of the next bar and
+        generates long/exit signals from the prediction.
+
+        Parameters
+        event - A MarketEvent object.
+        """
+        if event.type == 'MARKET':
+            sym = self.symbol_list[0]
+            rets = self.bars.get_latest_bars_values(
+                sym, "returns", N=self.lags
+            )
+            if len(rets) < self.lags or np.isnan(rets).any():
+                return
+
+            # The latest return is the realised outcome of the
+            # forecast made from the previous bar's predictors.
+            # Zero returns are treated as up bars, as in the
+            # batch model's training data.
+            if self.prev_features is not None:
+                direction = 1.0 if rets[-1] >= 0.0 else -1.0
+                self._update_model(self.prev_features, direction)
+
+            # Lag1 is the most recent return, Lag2 the one before etc.
+            features = (rets[::-1] * 100.0).reshape(1, -1)
+            self.prev_features = features
+
+            if self.n_updates < self.warmup:
+                return
+
+            pred = self.model.predict(features)[0]
+            cur_date = self.bars.get_latest_bar_datetime(sym)
+            if pred > 0 and not self.long_market:
+                self.long_market = True
+                signal = SignalEvent(1, sym, cur_date, 'LONG', 1.0)
+                self.events.put(signal)
+
+            if pred < 0 and self.long_market:
+                self.long_market = False
+                signal = SignalEvent(1, sym, cur_date, 'EXIT', 1.0)
+                self.events.put(signal)
+
+    def update_latency_stats(self):
+        """
+        Returns the summary statistics of the per-bar
+        model update latency.
+        """
+        return latency_summary(self.update_latencies)
+
+
+def latency_summary(latencies):
+    """
+    Summarises a sequence of latencies, given in seconds, as the
+    mean, median, 99th percentile and maximum in microseconds.
+
+    Parameters:
+    latencies - A sequence of latencies in seconds.
+    """
+    lat = np.asarray(latencies) * 1e6
+    if lat.size == 0:
+        return {}
+    return {
+        "updates": lat.size,
+        "mean_us": lat.mean(),
+        "median_us": np.median(lat),
+        "p99_us": np.percentile(lat, 99),
+        "max_us": lat.max(),
+    }
+
+
+def benchmark_update_latency(model=None, n_bars=100000, lags=2, seed=42):
+    """
+    Measures the per-bar update latency of an incremental learner
+    on a synthetic returns series, without the rest of the backtest.
+
+    Parameters:
+    model - An unfitted classifier supporting partial_fit.
+    n_bars - The number of bars (updates) to time.
+    lags - The number of lagged returns used as predictors.
+    seed - The random seed for the synthetic returns.
+    """
+    if model is None:
+        model = SGDClassifier(loss="log_loss", alpha=1e-4)
+    classes = np.array([-1.0, 1.0])
+    rets = np.random.default_rng(seed).normal(0.0, 0.01, n_bars + lags)
+
+    lat = np.empty(n_bars)
+    for i in range(n_bars):
+        features = (rets[i:i + lags][::-1] * 100.0).reshape(1, -1)
+        direction = np.array([1.0 if rets[i + lags] >= 0.0 else -1.0])
+        start = time.perf_counter()
+        model.partial_fit(features, direction, classes=classes)
+        lat[i] = time.perf_counter() - start
+    return latency_summary(lat)
+
+
+if __name__ == "__main__":
+    csv_dir = '/path/to/your/csv/file'
+    symbol_list = ['SPY']
+    initial_capital = 100000.0
+    heartbeat = 0.0
+    start_date = dt(2017,1,3)
+
+    backtest = Backtest(
+        csv_dir, symbol_list, initial_capital, heartbeat,
+        start_date, HistoricCSVDataHandler, SimulatedExecutionHandler,
+        Portfolio, SPYOnlineForecastStrategy
+    )
+    configure_telemetry(trade_log='trades.log')
+    backtest.simulate_trading()
+    print("Model update latency: %s" % backtest.strategy.update_latency_stats())
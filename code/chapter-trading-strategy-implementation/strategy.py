@@ -25,6 +25,11 @@ class Strategy(object):
 
     __metaclass__ = ABCMeta
 
+    # The greatest number of bars the strategy asks the data
+    # handler for at a time, so that only that many need keeping,
+    # or None if it needs the whole history
+    max_lookback = None
+
     @abstractmethod
     def calculate_signals(self):
         """
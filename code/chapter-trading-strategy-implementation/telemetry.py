@@ -0,0 +1,126 @@
+# telemetry.py
+
+import logging
+import logging.handlers
+import time
+
+
+# The loggers of a backtest. Progress and trades are children of
+# the backtest logger, so can be gated and routed separately.
+logger = logging.getLogger('backtest')
+progress_logger = logging.getLogger('backtest.progress')
+trade_logger = logging.getLogger('backtest.trades')
+
+
+def configure_telemetry(level=logging.INFO, trade_log=None, capacity=1000):
+    """
+    Sends the backtest telemetry to stderr, and optionally the
+    trades to a file. Without this only warnings are shown, so a
+    backtest does no terminal or file I/O per bar by default.
+
+    The trade log is buffered in a MemoryHandler, which writes to
+    the file once capacity records have accumulated, on an error
+    or when logging shuts down at exit.
+
+    Parameters:
+    level - The level of the progress telemetry, e.g. logging.INFO
+        for periodic progress reports.
+    trade_log - An optional file to log the signals and fills to.
+    capacity - The number of trade records buffered per write.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s: %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+
+    if trade_log is not None:
+        file_handler = logging.FileHandler(trade_log, mode='w')
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        trade_logger.addHandler(logging.handlers.MemoryHandler(
+            capacity, flushLevel=logging.ERROR, target=file_handler
+        ))
+        trade_logger.setLevel(logging.INFO)
+        # Keep the trades out of the terminal
+        trade_logger.propagate = False
+
+
+class ProgressReporter(object):
+    """
+    Reports the progress of a backtest at most once per interval:
+    the bars run, the rate in bars per second, the estimated time
+    remaining and the number of events waiting in the queues.
+
+    The clock is only read every sample bars, so the check costs
+    next to nothing per bar, and nothing is formatted unless the
+    progress logger is enabled for INFO.
+    """
+
+    def __init__(self, total_bars=None, interval=10.0, sample=256):
+        """
+        Initialises the reporter.
+
+        Parameters:
+        total_bars - The number of bars in the backtest, if known,
+            for the estimated time remaining.
+        interval - The minimum number of seconds between reports.
+        sample - The number of bars between reads of the clock.
+        """
+        self.total_bars = total_bars
+        self.interval = interval
+        self.sample = sample
+        self.start_bars = None
+
+    def update(self, bars, queue_depth):
+        """
+        Reports the progress if the interval has elapsed.
+
+        Parameters:
+        bars - The number of bars run so far.
+        queue_depth - A callable returning the number of
+            events waiting.
+        """
+        if bars % self.sample != 0 or not progress_logger.isEnabledFor(logging.INFO):
+            return
+        now = time.perf_counter()
+        if self.start_bars is None:
+            # Time from the first report, so that a resumed
+            # backtest's rate only counts its own bars
+            self.start_time = self.last_report = now
+            self.start_bars = bars
+            return
+        if now - self.last_report < self.interval:
+            return
+        self.last_report = now
+
+        rate = (bars - self.start_bars) / (now - self.start_time)
+        if self.total_bars:
+            eta = "%0.0fs" % ((self.total_bars - bars) / rate) if rate > 0 else "-"
+            progress_logger.info(
+                "%d/%d bars (%0.1f%%), %0.0f bars/s, ETA %s, %d events queued",
+                bars, self.total_bars, 100.0 * bars / self.total_bars,
+                rate, eta, queue_depth()
+            )
+        else:
+            progress_logger.info(
+                "%d bars, %0.0f bars/s, %d events queued",
+                bars, rate, queue_depth()
+            )
+
+    def __getstate__(self):
+        """
+        Restarts the timing when a checkpointed backtest is resumed.
+        """
+        state = self.__dict__.copy()
+        state['start_bars'] = None
+        return state
+
+
+def total_bars(data_handler):
+    """
+    The number of bars a historic data handler will run through,
+    or None if unknown (e.g. a live feed).
+    """
+    symbol_data = getattr(data_handler, 'symbol_data', None)
+    if symbol_data:
+        return len(next(iter(symbol_data.values())))
+    return None